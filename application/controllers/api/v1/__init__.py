@@ -349,6 +349,7 @@ mod.add_url_rule("/api/v1/user/settings/od-drug", view_func=user_settings.toggle
 mod.add_url_rule("/api/v1/user/settings/public-data", view_func=user_settings.toggle_public_data, methods=["PUT"])
 mod.add_url_rule("/api/v1/user/settings/stat-db", view_func=user_settings.toggle_stat_db, methods=["PUT"])
 mod.add_url_rule("/api/v1/user/<int:tid>", view_func=user.get_specific_user, methods=["GET"])
+mod.add_url_rule("/api/v1/user/estimate", view_func=user.estimate_users_bulk, methods=["GET"])
 mod.add_url_rule(
     "/api/v1/user/estimate/<int:tid>",
     view_func=user.estimate_specific_user,
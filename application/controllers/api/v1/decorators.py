@@ -13,7 +13,6 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-import time
 import typing
 from functools import partial, wraps
 
@@ -23,6 +22,7 @@ from flask_login import current_user
 from tornium_commons import rds
 from tornium_commons.altjson import dumps, loads
 from tornium_commons.oauth import BearerTokenValidator, ResourceProtector
+from tornium_commons.ratelimit import consume_tokens
 
 from controllers.api.v1.utils import api_ratelimit_response, make_exception_response
 
@@ -41,13 +41,9 @@ def ratelimit(func):
             kwargs["key"] = current_user.key
             kwargs["method"] = "session"
 
-        client = rds()
         key = f"tornium:ratelimit:{kwargs['user'].tid}"
 
-        current_count = int(client.incr(key))
-        client.expireat(key, int(time.time()) // 60 * 60 + 60)
-
-        if current_count > 250:
+        if not consume_tokens(key, 250).allowed:
             return make_exception_response("4000", key)
 
         return func(*args, **kwargs)
@@ -73,11 +69,7 @@ def scoped_ratelimit(scope, maximum):
             else:
                 raise Exception("Invalid scope type")
 
-            client = rds()
-            current_count = int(client.incr(key))
-            client.expireat(key, int(time.time()) // 60 * 60 + 60)
-
-            if current_count > maximum:
+            if not consume_tokens(key, maximum).allowed:
                 return make_exception_response("4000", key, details={"scope": key})
 
             return f(*args, **kwargs)
@@ -13,14 +13,17 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-import csv
 import datetime
-import io
+import hashlib
+import itertools
+import typing
 
-from flask import make_response, request
-from peewee import fn
+from flask import request
+from peewee import JOIN, Tuple, fn
+from tornium_commons import rds
 from tornium_commons.formatters import timestamp
 from tornium_commons.models import ArmoryAction, ArmoryUsage, Item, User
+from tornium_commons.names import item_names, user_names
 
 from controllers.api.v1.decorators import ratelimit, require_oauth
 from controllers.api.v1.utils import (
@@ -28,9 +31,23 @@ from controllers.api.v1.utils import (
     get_list,
     make_exception_response,
 )
+from utils.csv_export import stream_query_csv
 
 armory_action_values = [action.value for action in ArmoryAction]
 
+# Number of seconds the total count of armory logs is cached for when paginating with cursors
+ARMORY_LOGS_COUNT_TTL = 60
+
+
+def _parse_logs_cursor(cursor: str) -> typing.Tuple[datetime.datetime, str]:
+    # Cursors are formatted as `{timestamp}:{id}` of the last log of the previous page
+    cursor_timestamp, _, cursor_id = cursor.partition(":")
+
+    if cursor_id == "":
+        raise ValueError
+
+    return datetime.datetime.fromtimestamp(int(cursor_timestamp), tz=datetime.timezone.utc), cursor_id
+
 
 @require_oauth("faction:armory", "faction")
 @ratelimit
@@ -52,6 +69,19 @@ def get_logs(faction_id: int, *args, **kwargs):
     except (TypeError, ValueError):
         return make_exception_response("1000", key)
 
+    # Passing a cursor (an empty cursor for the first page) paginates with the cursor of the last log of the previous
+    # page instead of an offset, so the cost of each page does not depend on the depth of the page
+    cursor: typing.Optional[str] = request.args.get("cursor")
+    cursor_position: typing.Optional[typing.Tuple[datetime.datetime, str]] = None
+
+    if cursor not in (None, ""):
+        try:
+            cursor_position = _parse_logs_cursor(cursor)
+        except (ValueError, OverflowError, OSError):
+            return make_exception_response(
+                "0000", key, details={"element": "cursor", "message": "There was an invalid cursor provided."}
+            )
+
     members = get_list(request.args, "members", int)
     actions = get_list(request.args, "actions", str)
     items = get_list(request.args, "items", int)
@@ -64,6 +94,12 @@ def get_logs(faction_id: int, *args, **kwargs):
         return make_exception_response(
             "0000", key, details={"element": "offset", "message": "The offset must be greater than or equal to 0."}
         )
+    elif cursor is not None and offset != 0:
+        return make_exception_response(
+            "0000",
+            key,
+            details={"element": "offset", "message": "The offset can not be used when paginating with a cursor."},
+        )
     elif len(actions) > 0 and any([action not in armory_action_values for action in actions]):
         return make_exception_response(
             "0000", key, details={"element": "actions", "message": "There was an invalid action provided."}
@@ -101,10 +137,18 @@ def get_logs(faction_id: int, *args, **kwargs):
     if len(items) != 0:
         logs = logs.where(ArmoryUsage.item_id.in_(items))
 
+    filtered_logs = logs
+
     if sort_order == "timestamp-desc":
-        logs = logs.order_by(ArmoryUsage.timestamp.desc())
+        logs = logs.order_by(ArmoryUsage.timestamp.desc(), ArmoryUsage.id.desc())
+
+        if cursor_position is not None:
+            logs = logs.where(Tuple(ArmoryUsage.timestamp, ArmoryUsage.id) < Tuple(*cursor_position))
     elif sort_order == "timestamp-asc":
-        logs = logs.order_by(ArmoryUsage.timestamp.asc())
+        logs = logs.order_by(ArmoryUsage.timestamp.asc(), ArmoryUsage.id.asc())
+
+        if cursor_position is not None:
+            logs = logs.where(Tuple(ArmoryUsage.timestamp, ArmoryUsage.id) > Tuple(*cursor_position))
     else:
         return make_exception_response(
             "0000",
@@ -116,22 +160,65 @@ def get_logs(faction_id: int, *args, **kwargs):
         )
 
     if request.accept_mimetypes.accept_json:
-        total_count_expression = fn.COUNT(ArmoryUsage.id).over()
-        logs = logs.select(ArmoryUsage, total_count_expression.alias("total_count"))
-        paged_logs = list(logs.limit(limit).offset(offset))
-        total_count = paged_logs[0].total_count if paged_logs else 0
+        # The names of the users and items are retrieved within the same query as the logs
+        Recipient = User.alias()
+        log_columns = [
+            ArmoryUsage,
+            User.name.alias("user_name"),
+            Recipient.name.alias("recipient_name"),
+            Item.name.alias("item_name"),
+        ]
+        logs = (
+            logs.join(User, JOIN.LEFT_OUTER, on=(ArmoryUsage.user == User.tid))
+            .switch(ArmoryUsage)
+            .join(Recipient, JOIN.LEFT_OUTER, on=(ArmoryUsage.recipient == Recipient.tid))
+            .switch(ArmoryUsage)
+            .join(Item, JOIN.LEFT_OUTER, on=(ArmoryUsage.item == Item.tid))
+        )
+
+        if cursor is None:
+            total_count_expression = fn.COUNT(ArmoryUsage.id).over()
+            logs = logs.select(*log_columns, total_count_expression.alias("total_count"))
+            paged_logs = list(logs.limit(limit).offset(offset).objects())
+            total_count = paged_logs[0].total_count if paged_logs else 0
+
+            return (
+                {"count": total_count, "logs": ArmoryUsage.to_dicts(paged_logs)},
+                200,
+                api_ratelimit_response(key),
+            )
+
+        paged_logs = list(logs.select(*log_columns).limit(limit).objects())
+
+        # The total count is counted separately from the page and is cached for a short period as the total count
+        # would otherwise require scanning all of the faction's filtered logs for each page
+        count_filters = (
+            faction_id,
+            sorted(members),
+            sorted(actions),
+            sorted(items),
+            from_timestamp,
+            None if to_timestamp == now else to_timestamp,
+        )
+        count_key = f"tornium:armory-logs:count:{hashlib.sha1(repr(count_filters).encode()).hexdigest()}"
+        total_count = rds().get(count_key)
+
+        if total_count is None:
+            total_count = filtered_logs.count()
+            rds().set(count_key, total_count, ex=ARMORY_LOGS_COUNT_TTL)
 
         return (
-            {"count": total_count, "logs": [log.to_dict() for log in paged_logs]},
+            {
+                "count": int(total_count),
+                "logs": ArmoryUsage.to_dicts(paged_logs),
+                "cursor": (
+                    f"{timestamp(paged_logs[-1].timestamp)}:{paged_logs[-1].id}" if len(paged_logs) == limit else None
+                ),
+            },
             200,
             api_ratelimit_response(key),
         )
     elif "text/csv" in request.accept_mimetypes:
-        logs = logs.select(ArmoryUsage)
-
-        buffer = io.StringIO()
-        writer = csv.writer(buffer)
-
         header = [
             "id",
             "timestamp",
@@ -142,28 +229,36 @@ def get_logs(faction_id: int, *args, **kwargs):
             "is_energy_refill",
             "is_nerve_refill",
             "quantity",
-        ]
-        data = [
-            [
-                log.id,
-                timestamp(log.timestamp),
-                log.action,
-                log.user_id,
-                log.recipient_id,
-                log.item_id,
-                log.is_energy_refill,
-                log.is_nerve_refill,
-                log.quantity,
-            ]
-            for log in logs
+            "user_name",
+            "recipient_name",
+            "item_name",
         ]
 
-        writer.writerow(header)
-        writer.writerows(data)
+        def format_logs(chunk: typing.List[ArmoryUsage]):
+            resolved_user_names = user_names.resolve_many(
+                itertools.chain.from_iterable((log.user_id, log.recipient_id) for log in chunk)
+            )
+            resolved_item_names = item_names.resolve_many(log.item_id for log in chunk if log.item_id is not None)
+
+            return [
+                [
+                    log.id,
+                    timestamp(log.timestamp),
+                    log.action,
+                    log.user_id,
+                    log.recipient_id,
+                    log.item_id,
+                    log.is_energy_refill,
+                    log.is_nerve_refill,
+                    log.quantity,
+                    resolved_user_names.get(log.user_id),
+                    resolved_user_names.get(log.recipient_id),
+                    resolved_item_names.get(log.item_id),
+                ]
+                for log in chunk
+            ]
 
-        response = make_response(buffer.getvalue())
-        response.headers["Content-Type"] = "text/csv"
-        return response
+        return stream_query_csv(logs.select(ArmoryUsage), header, format_logs)
     else:
         return make_exception_response("4012", key)
 
@@ -274,6 +369,12 @@ def get_cumulative(faction_id: int, *args, **kwargs):
         paged_cumulative = list(cumulative.limit(limit).offset(offset))
         total_count = paged_cumulative[0].total_count if paged_cumulative else 0
 
+        # The names of the page's users and items are resolved in bulk instead of for each group
+        resolved_user_names = user_names.resolve_many(group.user_id for group in paged_cumulative)
+        resolved_item_names = item_names.resolve_many(
+            group.item_id for group in paged_cumulative if group.item_id is not None
+        )
+
         return (
             {
                 "count": total_count,
@@ -282,11 +383,13 @@ def get_cumulative(faction_id: int, *args, **kwargs):
                         "action": group.action,
                         "user": {
                             "id": group.user_id,
-                            "name": User.user_name(group.user_id),
+                            "name": resolved_user_names.get(group.user_id, "N/A"),
                         },
                         "item": {
                             "id": group.item_id,
-                            "name": None if group.item_id is None else Item.item_name(group.item_id),
+                            "name": (
+                                None if group.item_id is None else resolved_item_names.get(group.item_id, "Unknown")
+                            ),
                             "is_nerve_refill": group.is_nerve_refill,
                             "is_energy_refill": group.is_energy_refill,
                         },
@@ -299,27 +402,26 @@ def get_cumulative(faction_id: int, *args, **kwargs):
             api_ratelimit_response(key),
         )
     elif "text/csv" in request.accept_mimetypes:
-        buffer = io.StringIO()
-        writer = csv.writer(buffer)
-
-        header = ["action", "user", "item", "is_energy_refill", "is_nerve_refill", "quantity"]
-        data = [
-            [
-                group.action,
-                group.user_id,
-                group.item_id,
-                group.is_energy_refill,
-                group.is_nerve_refill,
-                group.cumulative_usage,
+        header = ["action", "user", "item", "is_energy_refill", "is_nerve_refill", "quantity", "user_name", "item_name"]
+
+        def format_cumulative(chunk: typing.List[ArmoryUsage]):
+            resolved_user_names = user_names.resolve_many(group.user_id for group in chunk)
+            resolved_item_names = item_names.resolve_many(group.item_id for group in chunk if group.item_id is not None)
+
+            return [
+                [
+                    group.action,
+                    group.user_id,
+                    group.item_id,
+                    group.is_energy_refill,
+                    group.is_nerve_refill,
+                    group.cumulative_usage,
+                    resolved_user_names.get(group.user_id),
+                    resolved_item_names.get(group.item_id),
+                ]
+                for group in chunk
             ]
-            for group in cumulative
-        ]
-
-        writer.writerow(header)
-        writer.writerows(data)
 
-        response = make_response(buffer.getvalue())
-        response.headers["Content-Type"] = "text/csv"
-        return response
+        return stream_query_csv(cumulative, header, format_cumulative)
     else:
         return make_exception_response("4012", key)
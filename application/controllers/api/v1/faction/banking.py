@@ -15,15 +15,15 @@
 
 import datetime
 import json
-import random
 import uuid
 
 from flask import jsonify, request
 from peewee import DataError, DoesNotExist
-from tornium_celery.tasks.api import discordpatch, discordpost, tornget
-from tornium_commons.errors import NetworkingError, TornError
+from tornium_celery.tasks.api import coalesced_tornget, discordpatch, discordpost
+from tornium_commons.errors import NetworkingError, RatelimitError, TornError
 from tornium_commons.formatters import text_to_num
 from tornium_commons.models import User, Withdrawal
+from tornium_commons.ratelimit import choose_torn_key
 
 from controllers.api.v1.decorators import ratelimit, require_oauth
 from controllers.api.v1.utils import api_ratelimit_response, make_exception_response
@@ -41,7 +41,13 @@ def vault_balance(*args, **kwargs):
         return make_exception_response("1201", key)
 
     try:
-        vault_balances = tornget("faction/?selections=donations", random.choice(user.faction.aa_keys))
+        vault_balances = coalesced_tornget(
+            f"faction/{user.faction_id}?selections=donations", lambda: choose_torn_key(user.faction.aa_keys)
+        )
+    except RatelimitError:
+        return make_exception_response(
+            "4290", key, details={"message": "The API keys of the faction's AA members have reached their ratelimit."}
+        )
     except TornError as e:
         return make_exception_response(
             "4100",
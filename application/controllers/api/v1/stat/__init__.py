@@ -20,7 +20,7 @@ from flask import jsonify, request
 from peewee import JOIN, SQL, DoesNotExist, fn
 from tornium_celery.tasks.user import update_user
 from tornium_commons import db
-from tornium_commons.models import Faction, Stat, User
+from tornium_commons.models import Faction, LatestStat, Stat, User
 
 from controllers.api.v1.decorators import ratelimit, require_oauth, scoped_ratelimit
 from controllers.api.v1.utils import api_ratelimit_response, make_exception_response
@@ -179,11 +179,18 @@ def generate_chain_list_v2(*args, **kwargs):
     maximum_stat_score = int(0.375 * user.battlescore * (maximum_difficulty - 1))
     groups = (0,) if user.faction_id in (0, None) else (0, user.faction_id)
 
+    # The latest stats are filtered by the battlescore range before de-duplicating the groups' stats of each user so
+    # that only the range of the `latest_stat` index is scanned. Only the latest stat of each user and group is
+    # considered, so a user is listed with the latest of their groups' latest stats within the battlescore range.
     stat_subquery = (
-        Stat.select(Stat.tid_id, Stat.time_added, Stat.battlescore)
-        .where((Stat.time_added > SQL("NOW() - INTERVAL '6 months'")) & (Stat.added_group.in_(groups)))
-        .order_by(Stat.tid_id, Stat.time_added.desc())
-        .distinct(Stat.tid_id)
+        LatestStat.select(LatestStat.tid_id, LatestStat.time_added, LatestStat.battlescore)
+        .where(
+            (LatestStat.added_group.in_(groups))
+            & (LatestStat.battlescore.between(minimum_stat_score, maximum_stat_score))
+            & (LatestStat.time_added > SQL("NOW() - INTERVAL '6 months'"))
+        )
+        .order_by(LatestStat.tid_id, LatestStat.time_added.desc())
+        .distinct(LatestStat.tid_id)
     )
     s = stat_subquery.alias("s")
 
@@ -208,7 +215,7 @@ def generate_chain_list_v2(*args, **kwargs):
             fair_fight_alias,
             respect_alias,
         )
-        .join(s, on=(User.tid == s.c.tid_id))
+        .join(s, on=(User.tid == s.c.tid_id), attr="stat")
         .join(Faction, JOIN.LEFT_OUTER, on=(Faction.tid == User.faction_id))
         .where(
             ((User.fedded_until.is_null(True)) | (User.fedded_until <= datetime.datetime.utcnow()))
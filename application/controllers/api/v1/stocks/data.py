@@ -55,13 +55,12 @@ def stocks_data(*args, **kwargs):
 
         now = int(now.replace(second=0, microsecond=0, tzinfo=datetime.timezone.utc).timestamp())
 
-        ticks: typing.List[StockTick] = []
+        now_ticks: typing.Dict[int, StockTick] = StockTick.ticks_at([now])[now]
 
-        for stock_id in stock_id_list:
-            try:
-                ticks.append(StockTick.get_by_id(int(bin(stock_id), 2) + int(bin(now << 8), 2)))
-            except DoesNotExist:
-                return make_exception_response("1000", key, details={"message": "Unknown stocks tick."})
+        if any(stock_id not in now_ticks for stock_id in stock_id_list):
+            return make_exception_response("1000", key, details={"message": "Unknown stocks tick."})
+
+        ticks: typing.List[StockTick] = [now_ticks[stock_id] for stock_id in stock_id_list]
 
     stocks_tick_data = {}
 
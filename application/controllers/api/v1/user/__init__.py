@@ -23,10 +23,15 @@ from peewee import DoesNotExist
 from tornium_celery.tasks.user import update_user
 from tornium_commons.formatters import bs_to_range
 from tornium_commons.models import Server, Stat, User
+from tornium_commons.ratelimit import consume_tokens
 
 from controllers.api.v1.decorators import ratelimit, require_oauth, session_required
-from controllers.api.v1.utils import api_ratelimit_response, make_exception_response
-from estimate import estimate_user
+from controllers.api.v1.utils import (
+    api_ratelimit_response,
+    get_list,
+    make_exception_response,
+)
+from estimate import estimate_user, estimate_users
 
 
 @require_oauth("identity")
@@ -133,6 +138,51 @@ def estimate_specific_user(tid: int, *args, **kwargs):
     )
 
 
+@require_oauth()
+@ratelimit
+def estimate_users_bulk(*args, **kwargs):
+    key = f"tornium:ratelimit:{kwargs['user'].tid}"
+    user_ids = get_list(request.args, "ids", int)
+
+    if len(user_ids) == 0:
+        return make_exception_response(
+            "0000",
+            key,
+            details={"message": "No user IDs were provided."},
+        )
+    elif len(user_ids) > 100:
+        return make_exception_response(
+            "0000",
+            key,
+            details={"message": "At most 100 users can be estimated at once."},
+        )
+
+    # Each estimate is charged against the ratelimit as a separate call with the first estimate charged by `ratelimit`
+    if len(user_ids) > 1 and not consume_tokens(key, 250, cost=len(user_ids) - 1).allowed:
+        return make_exception_response("4000", key)
+
+    try:
+        estimates = estimate_users(user_ids)
+    except ValueError:
+        return make_exception_response("1100", key)
+
+    estimates_data = {}
+    for user_id, (estimated_bs, expiration_ts) in estimates.items():
+        min_bs, max_bs = bs_to_range(estimated_bs)
+        estimates_data[user_id] = {
+            "stat_score": estimated_bs,
+            "min_bs": min_bs,
+            "max_bs": max_bs,
+            "expiration": expiration_ts,
+        }
+
+    return (
+        {"estimates": estimates_data},
+        200,
+        api_ratelimit_response(key),
+    )
+
+
 @require_oauth()
 @ratelimit
 def latest_user_stats(tid: int, *args, **kwargs):
@@ -13,33 +13,31 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-import csv
 import datetime
-import io
+import itertools
 import typing
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from flask import (
-    Blueprint,
-    Response,
-    abort,
-    render_template,
-    request,
-    stream_with_context,
-)
+from flask import Blueprint, abort, render_template, request
 from flask_login import current_user, login_required
 from peewee import DoesNotExist
-from tornium_celery.tasks.api import tornget
+from tornium_celery.tasks.api import coalesced_tornget
 from tornium_commons.db_connection import db
 from tornium_commons.formatters import bs_to_range, commas, get_tid, rel_time
 from tornium_commons.models import Faction, Stat, User
+from tornium_commons.names import user_names
 
-import utils
 from controllers.faction.decorators import aa_required
-from estimate import estimate_user
+from estimate import estimate_user, estimate_users
+from utils.csv_export import csv_response
+from utils.datatables import capped_count, estimated_count, paginate
 
 mod = Blueprint("statroutes", __name__)
 
+# Number of members written to the faction stats CSV at a time. Members estimated with API calls are written as their
+# estimates complete, so the chunks are kept small to avoid waiting for the estimates of the entire faction.
+FACTION_STATS_CHUNK_SIZE = 10
+
 
 @mod.route("/stats")
 def index():
@@ -87,18 +85,35 @@ def stats_data():
         stat_entries = stat_entries.where(Stat.battlescore >= int(min_bs))
 
     if ordering == 0:
-        stat_entries = stat_entries.order_by(utils.table_order(ordering_direction, Stat.tid))
+        sort_column = Stat.tid
     elif ordering == 1:
-        stat_entries = stat_entries.order_by(utils.table_order(ordering_direction, Stat.battlescore))
+        sort_column = Stat.battlescore
     else:
-        stat_entries = stat_entries.order_by(utils.table_order(ordering_direction, Stat.time_added))
+        sort_column = Stat.time_added
+
+    filters = (current_user.is_authenticated and current_user.faction_id, search_value, min_bs, max_bs)
+    records_filtered = capped_count(stat_entries, "stat", filters)
+    stat_entries_subset = paginate(
+        stat_entries,
+        "stat",
+        sort_column,
+        ordering_direction,
+        start,
+        length,
+        filters,
+        seek_fields=(Stat.battlescore, Stat.time_added),
+    )
 
-    stat_entries_subset = stat_entries.paginate(start // length + 1, length)
-    stat_entries_subset.join(User)
+    # The names of the page's users are resolved in bulk instead of for each stat entry
+    resolved_user_names = user_names.resolve_many(stat_entry.tid_id for stat_entry in stat_entries_subset)
 
     stats = [
         [
-            (stat_entry.tid_id if stat_entry.tid is None else f"{stat_entry.tid.name} [{stat_entry.tid_id}]"),
+            (
+                stat_entry.tid_id
+                if stat_entry.tid_id not in resolved_user_names
+                else f"{resolved_user_names[stat_entry.tid_id]} [{stat_entry.tid_id}]"
+            ),
             commas(int(sum(bs_to_range(stat_entry.battlescore)) / 2)),
             rel_time(stat_entry.time_added),
         ]
@@ -107,8 +122,8 @@ def stats_data():
 
     return {
         "draw": request.args.get("draw"),
-        "recordsTotal": Stat.select().count(),
-        "recordsFiltered": stat_entries.select().count(),
+        "recordsTotal": estimated_count(Stat),
+        "recordsFiltered": records_filtered,
         "data": stats,
     }, 200
 
@@ -159,7 +174,7 @@ def generate_faction_stats_csv():
             for user in User.select(User.tid, User.name, User.level).where(User.faction_id == faction_id)
         )
     else:
-        faction_members_data = tornget(f"faction/{faction_id}?selections=basic", current_user.key)
+        faction_members_data = coalesced_tornget(f"faction/{faction_id}?selections=basic", current_user.key)
         faction_members = tuple(
             (int(user_id), user_data["name"], user_data["level"])
             for user_id, user_data in faction_members_data["members"].items()
@@ -167,62 +182,73 @@ def generate_faction_stats_csv():
 
     executor = ThreadPoolExecutor(max_workers=5)
 
-    def _row(*values):
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(values)
-        return output.getvalue()
-
     def estimate_user_with_context(*args, **kwargs):
         with db.connection_context():
             return estimate_user(*args, **kwargs)
 
-    @stream_with_context
-    def generate_csv():
-        yield _row("tid", "name", "level", "estimated_stat_score", "stat_score", "stat_score_timestamp")
+    def estimated_members():
+        # Members with cached estimates or recent personal stats are estimated together in a single batch so that
+        # only the remaining members need to be estimated individually with API calls
+        try:
+            batch_estimates = estimate_users(user[0] for user in faction_members)
+        except ValueError:
+            batch_estimates = {}
 
         futures = {
             executor.submit(estimate_user_with_context, user[0], current_user.key, current_user.key is not None): user
             for user in faction_members
+            if user[0] not in batch_estimates
         }
 
-        for future in as_completed(futures):
-            user_id, user_name, user_level = futures[future]
+        for user in faction_members:
+            if user[0] in batch_estimates:
+                yield user, batch_estimates[user[0]][0]
 
-            estimated_stat_score: typing.Optional[int]
+        for future in as_completed(futures):
             try:
-                result = future.result()
-                estimated_stat_score = int(result[0])
+                yield futures[future], int(future.result()[0])
             except Exception:
-                estimated_stat_score = None
+                yield futures[future], None
+
+    def chunks():
+        members_iterator = estimated_members()
+
+        while True:
+            chunk = list(itertools.islice(members_iterator, FACTION_STATS_CHUNK_SIZE))
+
+            if len(chunk) == 0:
+                return
+
+            # The latest stat of each member of the chunk is retrieved in a single query
+            stats_query = Stat.select(Stat.tid, Stat.battlescore, Stat.time_added).where(
+                Stat.tid << [user_id for (user_id, _, _), _ in chunk]
+            )
 
-            stat: typing.Optional[Stat]
             if current_user.faction_id not in (None, 0):
-                stat = (
-                    Stat.select()
-                    .where(
-                        (Stat.tid == user_id)
-                        & ((Stat.added_group == 0) | (Stat.added_group == current_user.faction_id))
-                    )
-                    .order_by(Stat.time_added.desc())
-                    .first()
-                )
+                stats_query = stats_query.where((Stat.added_group == 0) | (Stat.added_group == current_user.faction_id))
             else:
-                stat = Stat.select().where((Stat.tid == user_id) & (Stat.added_group == 0)).first()
-
-            yield _row(
-                user_id,
-                user_name,
-                user_level,
-                estimated_stat_score,
-                None if stat is None else int(stat.battlescore),
-                None if stat is None else int(stat.time_added.timestamp()),
-            )
+                stats_query = stats_query.where(Stat.added_group == 0)
+
+            with db.connection_context():
+                stats: typing.Dict[int, Stat] = {
+                    stat.tid_id: stat
+                    for stat in stats_query.order_by(Stat.tid, Stat.time_added.desc()).distinct(Stat.tid)
+                }
+
+            yield [
+                (
+                    user_id,
+                    user_name,
+                    user_level,
+                    estimated_stat_score,
+                    None if user_id not in stats else int(stats[user_id].battlescore),
+                    None if user_id not in stats else int(stats[user_id].time_added.timestamp()),
+                )
+                for (user_id, user_name, user_level), estimated_stat_score in chunk
+            ]
 
-    return Response(
-        generate_csv(),
-        mimetype="text/csv",
-        headers={
-            "Content-Disposition": f"attachment; filename=faction-stats-{faction.name}-{datetime.datetime.utcnow().isoformat()}.csv"
-        },
+    return csv_response(
+        ("tid", "name", "level", "estimated_stat_score", "stat_score", "stat_score_timestamp"),
+        chunks(),
+        filename=f"faction-stats-{faction.name}-{datetime.datetime.utcnow().isoformat()}.csv",
     )
@@ -19,6 +19,8 @@ from peewee import DoesNotExist
 from tornium_commons.formatters import commas
 from tornium_commons.models import Faction, User
 
+from utils.datatables import capped_count, estimated_count, paginate
+
 
 @login_required
 def factions():
@@ -39,20 +41,16 @@ def factions_data():
     if search_value != "":
         factions_db = factions_db.where(Faction.name.startswith(search_value))
 
-    if ordering_direction == "asc":
-        ordering_direction = 1
-    else:
-        ordering_direction = -1
-
     if ordering == 0:
-        factions_db = factions_db.order_by(ordering_direction * Faction.tid)
+        sort_column = Faction.tid
     elif ordering == 1:
-        factions_db = factions_db.order_by(ordering_direction * Faction.name)
+        sort_column = Faction.name
     else:
-        factions_db = factions_db.order_by(ordering_direction * Faction.respect)
+        sort_column = Faction.respect
 
-    count = factions_db.count()
-    factions_db = factions_db[start : start + length]
+    records_total = estimated_count(Faction)
+    records_filtered = records_total if search_value == "" else capped_count(factions_db, "faction", search_value)
+    factions_db = paginate(factions_db, "faction", sort_column, ordering_direction, start, length, search_value)
 
     faction: Faction
     for faction in factions_db:
@@ -66,8 +64,8 @@ def factions_data():
 
     data = {
         "draw": request.args.get("draw"),
-        "recordsTotal": Faction.select().count(),
-        "recordsFiltered": count,
+        "recordsTotal": records_total,
+        "recordsFiltered": records_filtered,
         "data": factions,
     }
 
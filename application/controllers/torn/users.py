@@ -19,6 +19,9 @@ from peewee import DoesNotExist
 from tornium_celery.tasks.user import update_user
 from tornium_commons.formatters import rel_time
 from tornium_commons.models import User
+from tornium_commons.names import faction_names
+
+from utils.datatables import capped_count, estimated_count, paginate
 
 
 @login_required
@@ -53,14 +56,12 @@ def users_data():
     else:
         sort_column = User.last_refresh
 
-    if ordering_direction == "asc":
-        sort_column = sort_column.asc()
-    else:
-        sort_column = sort_column.desc()
+    records_total = estimated_count(User)
+    records_filtered = records_total if search_value == "" else capped_count(users_db, "user", search_value)
+    users_db = paginate(users_db, "user", sort_column, ordering_direction, start, length, search_value)
 
-    users_db = users_db.order_by(sort_column)
-    count = users_db.count()
-    users_db = users_db[start : start + length]
+    # The names of the page's factions are resolved in bulk instead of for each user
+    resolved_faction_names = faction_names.resolve_many(user.faction_id for user in users_db)
 
     user: User
     for user in users_db:
@@ -69,7 +70,11 @@ def users_data():
                 "tid": user.tid,
                 "name": user.name,
                 "level": user.level,
-                "faction": ("Unknown" if user.faction is None else f"{user.faction.name} [{user.faction_id}]"),
+                "faction": (
+                    "Unknown"
+                    if user.faction_id not in resolved_faction_names
+                    else f"{resolved_faction_names[user.faction_id]} [{user.faction_id}]"
+                ),
                 "last_action": {
                     "display": (rel_time(user.last_action) if user.last_action is not None else ""),
                     "timestamp": user.last_action,
@@ -83,8 +88,8 @@ def users_data():
 
     data = {
         "draw": request.args.get("draw"),
-        "recordsTotal": User.select().count(),
-        "recordsFiltered": count,
+        "recordsTotal": records_total,
+        "recordsFiltered": records_filtered,
         "data": users,
     }
 
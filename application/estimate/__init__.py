@@ -17,7 +17,7 @@ import pathlib
 import time
 import typing
 
-import pandas as pd
+import numpy as np
 import xgboost
 from peewee import DoesNotExist
 from tornium_celery.tasks.user import update_user
@@ -47,29 +47,111 @@ _model_features: typing.List[str] = model_features()
 ESTIMATE_TTL = 604_800  # One week
 
 
-def to_dmatrix(personal_stats: PersonalStats, user_id: int) -> xgboost.DMatrix:
-    df = pd.DataFrame(columns=_model_features, index=[0])
+def _feature_row(personal_stats: PersonalStats, user_id: int) -> typing.List[int]:
+    row = []
 
     for field_name in _model_features:
         if field_name == "user":
-            df.loc[0, "user"] = user_id
+            row.append(user_id)
             continue
 
         try:
-            df.loc[0, field_name] = personal_stats.__getattribute__(field_name)
+            row.append(personal_stats.__getattribute__(field_name) or 0)
         except AttributeError:
-            df.loc[0, field_name] = 0
+            row.append(0)
+
+    return row
+
+
+def to_dmatrix(personal_stats: PersonalStats, user_id: int) -> xgboost.DMatrix:
+    return to_batch_dmatrix([(personal_stats, user_id)])
+
+
+def to_batch_dmatrix(rows: typing.Iterable[typing.Tuple[PersonalStats, int]]) -> xgboost.DMatrix:
+    """
+    Build a DMatrix with a row per user directly from a NumPy matrix in the model's feature order.
+    """
 
-    df = df.astype("int64")
-    return xgboost.DMatrix(df)
+    matrix = np.array([_feature_row(personal_stats, user_id) for personal_stats, user_id in rows], dtype=np.int64)
+    return xgboost.DMatrix(matrix.reshape(-1, len(_model_features)), feature_names=_model_features)
 
 
 def estimate_dmatrix(data: xgboost.DMatrix) -> int:
-    return int(model().predict(data)[0])
+    return int(_model.predict(data)[0])
+
+
+def estimate_users(user_tids: typing.Iterable[int]) -> typing.Dict[int, typing.Tuple[int, int]]:
+    """
+    Estimate the stat scores of multiple users at once without making any API calls.
+
+    Cached estimates are retrieved with a single pipeline, the latest personal stats of the remaining users are
+    retrieved with a single query, and all remaining users are estimated with a single prediction. Users without
+    sufficiently recent personal stats are not included in the returned estimates.
+
+    Parameters
+    ----------
+    user_tids : iterable of int
+        Torn IDs of the users to estimate
+
+    Returns
+    -------
+    estimates : dict
+        Mapping of the user's ID to the estimate and the expiration of the estimate as returned by `estimate_user`
+    """
+
+    if _model is None:
+        raise ValueError("No model was loaded")
+
+    user_tids = list(dict.fromkeys(user_tids))
+    redis_client = rds()
+    now = int(time.time())
+    estimates: typing.Dict[int, typing.Tuple[int, int]] = {}
+
+    if len(user_tids) == 0:
+        return estimates
+
+    pipeline = redis_client.pipeline()
+    for user_tid in user_tids:
+        pipeline.get(f"tornium:estimate:cache:{user_tid}")
+        pipeline.ttl(f"tornium:estimate:cache:{user_tid}")
+    cached_values = pipeline.execute()
+
+    uncached_tids = []
+    for user_tid, cached_estimate, cached_ttl in zip(user_tids, cached_values[::2], cached_values[1::2]):
+        try:
+            estimates[user_tid] = (int(cached_estimate), now + cached_ttl)
+        except (ValueError, TypeError):
+            uncached_tids.append(user_tid)
+
+    if len(uncached_tids) == 0:
+        return estimates
+
+    rows: typing.List[typing.Tuple[PersonalStats, int]] = [
+        (ps, ps.user_id)
+        for ps in PersonalStats.select()
+        .distinct(PersonalStats.user)
+        .where(PersonalStats.user << uncached_tids)
+        .order_by(PersonalStats.user, -PersonalStats.timestamp)
+        if now - date_to_timestamp(ps.timestamp) <= ESTIMATE_TTL
+    ]
+
+    if len(rows) == 0:
+        return estimates
+
+    predictions = _model.predict(to_batch_dmatrix(rows))
+
+    pipeline = redis_client.pipeline()
+    for (ps, user_tid), prediction in zip(rows, predictions):
+        estimate = int(prediction)
+        estimates[user_tid] = (estimate, now - date_to_timestamp(ps.timestamp) + ESTIMATE_TTL)
+        pipeline.set(f"tornium:estimate:cache:{user_tid}", estimate, ex=ESTIMATE_TTL)
+    pipeline.execute()
+
+    return estimates
 
 
 def estimate_user(user_tid: int, api_key: str, allow_api_calls: bool = True) -> typing.Tuple[int, int]:
-    if model() is None:
+    if _model is None:
         raise ValueError("No model was loaded")
 
     redis_client = rds()
@@ -11,7 +11,7 @@ let
     python-liquid
     pynacl
 
-    pandas
+    numpy
     scikit-learn
     xgboost
 
@@ -13,13 +13,13 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-import random
 import typing
 
 from peewee import DoesNotExist
-from tornium_celery.tasks.api import tornget
+from tornium_celery.tasks.api import coalesced_tornget
 from tornium_commons.formatters import commas, discord_escaper, find_list
 from tornium_commons.models import User
+from tornium_commons.ratelimit import choose_torn_key
 from tornium_commons.skyutils import SKYNET_ERROR, SKYNET_GOOD
 
 from skynet.decorators import invoker_required
@@ -116,7 +116,9 @@ def balance(interaction, *args, **kwargs):
             },
         }
 
-    faction_balances = tornget("faction/?selections=donations", random.choice(aa_keys))["donations"]
+    faction_balances = coalesced_tornget(
+        f"faction/{user.faction_id}?selections=donations", lambda: choose_torn_key(aa_keys)
+    )["donations"]
 
     if str(user.tid) not in faction_balances:
         return {
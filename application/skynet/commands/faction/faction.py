@@ -19,10 +19,16 @@ import time
 import typing
 
 from peewee import DoesNotExist
-from tornium_celery.tasks.api import discordget, discordpatch, discordpost, tornget
+from tornium_celery.tasks.api import (
+    coalesced_tornget,
+    discordget,
+    discordpatch,
+    discordpost,
+)
 from tornium_commons import db
 from tornium_commons.formatters import HumanTimeDelta, find_list
 from tornium_commons.models import Faction, Server, User
+from tornium_commons.ratelimit import choose_torn_key
 from tornium_commons.skyutils import SKYNET_ERROR, SKYNET_GOOD, SKYNET_INFO
 
 from skynet.decorators import invoker_required
@@ -627,10 +633,11 @@ def members_switchboard(interaction, *args, **kwargs):
                 },
             }
 
-        member_data = tornget(
+        member_data = coalesced_tornget(
             f"faction/{faction.tid}?selections=basic,members",
-            random.choice(aa_keys),
+            lambda: choose_torn_key(aa_keys),
             version=2,
+            scope=f"faction:{faction.tid}",
         )
 
         payload[0]["title"] = f"Revivable Members of {member_data['basic']['name']}"
@@ -671,7 +678,7 @@ def members_switchboard(interaction, *args, **kwargs):
 
     def revivable_other_faction():
         try:
-            member_data = tornget(
+            member_data = coalesced_tornget(
                 f"faction/{faction.tid}?selections=basic,members", random.choice(kwargs["admin_keys"]), version=2
             )
         except IndexError:
@@ -820,10 +827,11 @@ def members_switchboard(interaction, *args, **kwargs):
                 },
             }
 
-        member_data = tornget(
+        member_data = coalesced_tornget(
             f"faction/{faction.tid}?selections=basic,members",
-            random.choice(aa_keys),
+            lambda: choose_torn_key(aa_keys),
             version=2,
+            scope=f"faction:{faction.tid}",
         )
 
         revivable_users = []
@@ -951,7 +959,7 @@ def members_switchboard(interaction, *args, **kwargs):
             }
 
         try:
-            member_data = tornget(
+            member_data = coalesced_tornget(
                 f"faction/{faction.tid}?selections=basic,members", random.choice(kwargs["admin_keys"]), version=2
             )
         except IndexError:
@@ -1261,7 +1269,7 @@ def members_switchboard(interaction, *args, **kwargs):
         else:
             return revivable_ping_other_faction()
 
-    member_data = tornget(
+    member_data = coalesced_tornget(
         f"faction/{faction.tid}?selections=",
         key=random.choice(admin_keys),
     )
@@ -0,0 +1,160 @@
+# Copyright (C) 2021-2025 tiksan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import contextlib
+import csv
+import io
+import typing
+
+from flask import Response, stream_with_context
+from peewee import Query
+from playhouse.postgres_ext import ServerSideQuery
+from tornium_commons.db_connection import db
+
+EXPORT_CHUNK_SIZE = 1000
+
+
+def query_chunks(query: Query, chunk_size: int = EXPORT_CHUNK_SIZE) -> typing.Iterator[list]:
+    """
+    Iterate over the rows of a query in chunks read from a server-side cursor.
+
+    Only one chunk of the query's rows is held in memory at a time. The server-side cursor is a `WITH HOLD` cursor so
+    the query does not need to be iterated within a transaction, but it must be iterated within a DB connection. The
+    cursor is closed once the rows are exhausted or the iterator is closed (e.g. when the client disconnects).
+
+    Parameters
+    ----------
+    query : Query
+        Query to read the rows of
+    chunk_size : int
+        Number of rows fetched from the cursor and yielded at a time
+
+    Returns
+    -------
+    chunks : iterator of list
+        Chunks of rows of the query
+    """
+
+    server_side_query = ServerSideQuery(query, array_size=chunk_size)
+    chunk = []
+
+    try:
+        for row in server_side_query:
+            chunk.append(row)
+
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+
+        if len(chunk) != 0:
+            yield chunk
+    finally:
+        if server_side_query._cursor_wrapper is not None:
+            server_side_query._cursor_wrapper.cursor.close()
+
+
+def csv_response(
+    header: typing.Sequence[str],
+    chunks: typing.Iterable[typing.Iterable[typing.Sequence]],
+    filename: typing.Optional[str] = None,
+) -> Response:
+    """
+    Create a streamed CSV response that writes each chunk of rows as it is produced.
+
+    Parameters
+    ----------
+    header : sequence of str
+        Names of the columns of the CSV
+    chunks : iterable of iterable of sequence
+        Chunks of rows of the CSV
+    filename : str, optional
+        Filename of the CSV to download the CSV as an attachment
+
+    Returns
+    -------
+    response : Response
+        Streamed CSV response
+    """
+
+    @stream_with_context
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        writer.writerow(header)
+
+        try:
+            for chunk in chunks:
+                writer.writerows(chunk)
+                yield buffer.getvalue()
+
+                buffer.seek(0)
+                buffer.truncate(0)
+        finally:
+            # The chunks are closed when the response is closed before the chunks are exhausted (e.g. when the client
+            # disconnects) so that any resources held by the chunks are released
+            if hasattr(chunks, "close"):
+                chunks.close()
+
+        # Write the header for empty exports or any remaining rows
+        if buffer.tell() != 0:
+            yield buffer.getvalue()
+
+    headers = {}
+    if filename is not None:
+        headers["Content-Disposition"] = f"attachment; filename={filename}"
+
+    return Response(generate_csv(), mimetype="text/csv", headers=headers)
+
+
+def stream_query_csv(
+    query: Query,
+    header: typing.Sequence[str],
+    format_chunk: typing.Callable[[list], typing.Iterable[typing.Sequence]],
+    filename: typing.Optional[str] = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> Response:
+    """
+    Stream the rows of a query as a CSV.
+
+    The query is read from a server-side cursor within a DB connection held only while the CSV is streamed. Each chunk
+    of rows is converted to CSV rows by `format_chunk` so that any names can be resolved in bulk per chunk.
+
+    Parameters
+    ----------
+    query : Query
+        Query to export
+    header : sequence of str
+        Names of the columns of the CSV
+    format_chunk : Callable
+        Function converting a chunk of the query's rows to CSV rows
+    filename : str, optional
+        Filename of the CSV to download the CSV as an attachment
+    chunk_size : int
+        Number of rows fetched from the cursor at a time
+
+    Returns
+    -------
+    response : Response
+        Streamed CSV response
+    """
+
+    def chunks():
+        # The request's DB connection is closed after the request so the export uses its own connection
+        with db.connection_context(), contextlib.closing(query_chunks(query, chunk_size)) as query_chunks_iterator:
+            for chunk in query_chunks_iterator:
+                yield format_chunk(chunk)
+
+    return csv_response(header, chunks(), filename)
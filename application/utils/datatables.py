@@ -0,0 +1,195 @@
+# Copyright (C) 2021-2025 tiksan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import datetime
+import hashlib
+import typing
+
+import peewee
+from peewee import Tuple
+from tornium_commons import rds
+from tornium_commons.altjson import dumps, loads
+from tornium_commons.db_connection import db
+
+DATATABLES_TOTAL_COUNT_TTL = 300
+DATATABLES_FILTERED_COUNT_TTL = 60
+# Filtered counts are only counted up to this number of rows
+DATATABLES_FILTERED_COUNT_CAP = 10000
+DATATABLES_SEEK_TTL = 300
+
+
+def _filters_hash(filters: typing.Any) -> str:
+    return hashlib.sha1(repr(filters).encode()).hexdigest()
+
+
+def estimated_count(model: typing.Type[peewee.Model]) -> int:
+    """
+    Get the estimated number of rows of a model's table from the table statistics.
+
+    The estimate includes the rows of the table's partitions and is cached for a short period.
+
+    Parameters
+    ----------
+    model : Model
+        Model of the table
+
+    Returns
+    -------
+    count : int
+        Estimated number of rows of the table
+    """
+
+    table_name = model._meta.table_name
+    count_key = f"tornium:datatables:total:{table_name}"
+    count = rds().get(count_key)
+
+    if count is not None:
+        return int(count)
+
+    # Partitioned tables do not have statistics of their own, so the statistics of the partitions are included
+    count = int(
+        db.execute_sql(
+            "select coalesce(sum(greatest(c.reltuples, 0)), 0) from pg_class c where c.oid = %s::regclass "
+            "or c.oid in (select i.inhrelid from pg_inherits i where i.inhparent = %s::regclass)",
+            (f'public."{table_name}"', f'public."{table_name}"'),
+        ).fetchone()[0]
+    )
+    rds().set(count_key, count, ex=DATATABLES_TOTAL_COUNT_TTL)
+
+    return count
+
+
+def capped_count(query: peewee.Query, name: str, filters: typing.Any) -> int:
+    """
+    Get the number of rows of a filtered query counting at most `DATATABLES_FILTERED_COUNT_CAP` rows.
+
+    The count is cached for a short period for the filters.
+
+    Parameters
+    ----------
+    query : Query
+        Filtered query to count the rows of
+    name : str
+        Name of the table
+    filters : Any
+        Filters of the query used to cache the count
+
+    Returns
+    -------
+    count : int
+        Number of rows of the query up to `DATATABLES_FILTERED_COUNT_CAP`
+    """
+
+    count_key = f"tornium:datatables:filtered:{name}:{_filters_hash(filters)}"
+    count = rds().get(count_key)
+
+    if count is not None:
+        return int(count)
+
+    count = query.select(peewee.SQL("1")).limit(DATATABLES_FILTERED_COUNT_CAP).count()
+    rds().set(count_key, count, ex=DATATABLES_FILTERED_COUNT_TTL)
+
+    return count
+
+
+def paginate(
+    query: peewee.ModelSelect,
+    name: str,
+    sort_field: peewee.Field,
+    ordering_direction: str,
+    start: int,
+    length: int,
+    filters: typing.Any,
+    seek_fields: typing.Collection[peewee.Field] = (),
+) -> list:
+    """
+    Get a page of a DataTables table sorted by a column.
+
+    Sequential pages (e.g. scrolling through the table) seek from the sort key of the last row of the previous page
+    instead of skipping `start` rows with an offset. The sort key of the last row of each page is cached for a short
+    period; other pages fall back to an offset. Pages are only sought when sorted by the primary key or by one of the
+    `seek_fields` as the seek would otherwise not be able to use an index.
+
+    Parameters
+    ----------
+    query : ModelSelect
+        Filtered query of the table
+    name : str
+        Name of the table
+    sort_field : Field
+        Field to sort the table by; the primary key of the table is used to break ties
+    ordering_direction : str
+        Direction of the sort (`asc` or `desc`)
+    start : int
+        Index of the first row of the page
+    length : int
+        Number of rows of the page
+    filters : Any
+        Filters of the query used to cache the sort keys of the pages
+    seek_fields : collection of Field
+        Fields other than the primary key with an index on `(field, primary key)` that pages can be sought by
+
+    Returns
+    -------
+    rows : list
+        Rows of the page
+    """
+
+    primary_key = query.model._meta.primary_key
+    seek_key_prefix = f"tornium:datatables:seek:{name}:{_filters_hash(filters)}:{sort_field.name}:{ordering_direction}"
+    seekable = sort_field is primary_key or any(sort_field is seek_field for seek_field in seek_fields)
+
+    if sort_field is primary_key:
+        query = query.order_by(primary_key.asc() if ordering_direction == "asc" else primary_key.desc())
+    elif ordering_direction == "asc":
+        query = query.order_by(sort_field.asc(), primary_key.asc())
+    else:
+        query = query.order_by(sort_field.desc(), primary_key.desc())
+
+    seek = None if start == 0 or not seekable else rds().get(f"{seek_key_prefix}:{start}")
+
+    if seek is not None:
+        seek_value, seek_primary_key = loads(seek)
+
+        if sort_field is primary_key:
+            query = query.where(
+                primary_key > seek_primary_key if ordering_direction == "asc" else primary_key < seek_primary_key
+            )
+        elif ordering_direction == "asc":
+            # Nulls are sorted last in ascending order and first in descending order, so nulls follow any non-null
+            # sort key in ascending order and precede any non-null sort key in descending order
+            query = query.where(
+                (Tuple(sort_field, primary_key) > Tuple(seek_value, seek_primary_key)) | sort_field.is_null(True)
+            )
+        else:
+            query = query.where(Tuple(sort_field, primary_key) < Tuple(seek_value, seek_primary_key))
+
+        rows = list(query.limit(length))
+    else:
+        rows = list(query.limit(length).offset(start))
+
+    if seekable and len(rows) == length and rows[-1].__data__.get(sort_field.name) is not None:
+        last_value = rows[-1].__data__[sort_field.name]
+
+        if isinstance(last_value, datetime.datetime):
+            last_value = last_value.isoformat()
+
+        rds().set(
+            f"{seek_key_prefix}:{start + length}",
+            dumps([last_value, rows[-1].__data__[primary_key.name]]),
+            ex=DATATABLES_SEEK_TTL,
+        )
+
+    return rows
@@ -87,6 +87,11 @@ if celery_app is None:
             "enabled": True,
             "schedule": {"type": "cron", "minute": "*/10", "hour": "*"},
         },
+        "refresh-pending-users": {
+            "task": "tasks.user.refresh_pending_users",
+            "enabled": True,
+            "schedule": {"type": "periodic", "second": "15"},
+        },
         "check-api-keys": {
             "task": "tasks.user.check_api_keys",
             "enabled": True,
@@ -101,6 +106,11 @@ if celery_app is None:
             "task": "tasks.items.update_items",
             "enabled": True,
             "schedule": {"type": "cron", "minute": "0", "hour": "*/4"},
+        },  # Misc tasks
+        "maintain-stat-partitions": {
+            "task": "tasks.misc.maintain_stat_partitions",
+            "enabled": True,
+            "schedule": {"type": "cron", "minute": "30", "hour": "0"},
         },
     }
 
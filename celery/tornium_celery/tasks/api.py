@@ -13,14 +13,25 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-import datetime
+import hashlib
 import json
+import math
+import os
+import time
+import typing
+import urllib.parse
+import uuid
+import zlib
 
 if globals().get("orjson:loaded"):
     import orjson
 
 import requests
+from redis.client import NEVER_DECODE
+from redis.commands.core import Script
+from requests.adapters import HTTPAdapter
 from tornium_commons import Config, rds, with_db_connection
+from tornium_commons.altjson import dumps, loads
 from tornium_commons.errors import (
     DiscordError,
     MissingKeyError,
@@ -29,6 +40,12 @@ from tornium_commons.errors import (
     TornError,
 )
 from tornium_commons.models import TornKey
+from tornium_commons.ratelimit import (
+    TORN_RATELIMIT,
+    TORN_RATELIMIT_KEY_PREFIX,
+    consume_tokens,
+)
+from urllib3.util.retry import Retry
 
 import celery
 from celery.utils.log import get_task_logger
@@ -36,6 +53,116 @@ from celery.utils.log import get_task_logger
 logger = get_task_logger("celery_app")
 config = Config.from_cache()
 
+# Maximum number of calls per minute per TornStats API key
+TORN_STATS_RATELIMIT = 15
+# Prefix of the ratelimit keys of TornStats API keys storing the number of calls used within the current window (see
+# `TORN_RATELIMIT_KEY_PREFIX`)
+TORN_STATS_RATELIMIT_KEY_PREFIX = "tornium:ts-ratelimit-used"
+
+DISCORD_PROXY_URL = "http://localhost:4000/discord"
+
+# Number of seconds the responses of coalesced Torn API calls are cached for by selection. The shortest TTL of the
+# request's selections is used.
+TORN_CACHE_TTLS = {
+    "": 60,
+    "basic": 60,
+    "members": 15,
+    "donations": 15,
+}
+TORN_CACHE_DEFAULT_TTL = 10
+TORN_CACHE_LOCK_TIMEOUT = 5
+# Number of seconds callers wait for a concurrent identical API call before performing the API call themselves
+TORN_CACHE_WAIT_TIMEOUT = 1
+# Selections whose responses depend on the API key's owner (e.g. `members[].is_revivable` in API v2) by API version.
+# Responses including these selections are only shared within the caller's scope.
+TORN_CACHE_SCOPED_SELECTIONS = {
+    2: {"members"},
+}
+
+# KEYS[1] = lock key
+# ARGV[1] = token of the lock's owner
+#
+# The lock is only deleted by its owner so that a caller whose lock expired does not delete another caller's lock.
+_TORN_CACHE_UNLOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+
+return 0
+"""
+
+_torn_cache_unlock_script: typing.Optional[Script] = None
+
+# Responses of `tornget` called with `claim_check=True` are stored in Redis with only a reference to the stored response
+# being returned (and passed to linked tasks through the broker). The TTL matches the expiry of the linked tasks.
+CLAIM_CHECK_REFERENCE = "tornium:claim-check"
+CLAIM_CHECK_TTL = 300
+CLAIM_CHECK_COMPRESSION_THRESHOLD = 16384
+
+# Messages queued with `queue_discord_message` are sent by `drain_discord_outbound` with messages queued for the same
+# channel within the window being merged into a single message where possible
+DISCORD_OUTBOUND_KEY = "tornium:discord-outbound"
+DISCORD_OUTBOUND_WINDOW = 1
+DISCORD_OUTBOUND_BATCH_SIZE = 25
+DISCORD_OUTBOUND_SENDS_PER_RUN = 5
+# Number of seconds each queued message may take to be sent; all sends of a run must complete within the time limit of
+# `drain_discord_outbound`
+DISCORD_OUTBOUND_SEND_TIMEOUT = 2
+DISCORD_MAX_EMBEDS = 10
+DISCORD_MAX_ACTION_ROWS = 5
+DISCORD_MAX_CONTENT_LENGTH = 2000
+
+_session: typing.Optional[requests.Session] = None
+
+
+def _reset_session() -> None:
+    # Pooled connections of the parent process must not be shared with forked worker processes
+    global _session
+    _session = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_session)
+
+
+def http_session() -> requests.Session:
+    """
+    Returns the process-wide HTTP session used for requests to the Torn API, TornStats, and Discord.
+
+    Connections are kept alive and re-used between requests to avoid the TCP and TLS handshakes on every request.
+    Requests are only retried when the connection could not be established, so a retried request was never received
+    by the API (and does not need to be charged to the API key's ratelimit) and a read timeout is raised immediately
+    instead of being retried past the calling task's time limit.
+    """
+
+    global _session
+
+    if _session is not None:
+        return _session
+
+    pool_maxsize = config["http_pool_maxsize"] or 10
+
+    session = requests.Session()
+    session.mount(
+        "https://",
+        HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=pool_maxsize,
+            max_retries=Retry(total=2, connect=2, read=0, status=0, other=0, backoff_factor=0.1),
+        ),
+    )
+    session.mount(
+        DISCORD_PROXY_URL,
+        HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_maxsize,
+            max_retries=Retry(total=2, connect=2, read=0, status=0, other=0, backoff_factor=0.1),
+        ),
+    )
+
+    _session = session
+    return _session
+
 
 def discord_request(method: str, endpoint: str, body=None, params=None, headers=None, timeout=5):
     # We want a function to perform a direct Discord request which should only be used for debugging
@@ -53,7 +180,7 @@ def discord_request(method: str, endpoint: str, body=None, params=None, headers=
     else:
         payload = json.dumps(body)
 
-    return requests.request(
+    return http_session().request(
         method=method.upper(),
         url=f"https://discord.com/api/v10/{endpoint}",
         params=params,
@@ -63,9 +190,74 @@ def discord_request(method: str, endpoint: str, body=None, params=None, headers=
     )
 
 
+def claim_check_store(content: bytes) -> typing.Dict[str, str]:
+    """
+    Store the raw bytes of an API response in Redis to be retrieved by `claim_check_load`.
+
+    Responses larger than `CLAIM_CHECK_COMPRESSION_THRESHOLD` bytes are compressed with zlib before being stored.
+
+    Parameters
+    ----------
+    content : bytes
+        Raw bytes of the JSON response
+
+    Returns
+    -------
+    reference : dict
+        Reference to the stored response to be passed to `claim_check_load`
+    """
+
+    if len(content) > CLAIM_CHECK_COMPRESSION_THRESHOLD:
+        value = b"z" + zlib.compress(content, 1)
+    else:
+        value = b"r" + content
+
+    reference = f"{CLAIM_CHECK_REFERENCE}:{uuid.uuid4().hex}"
+    rds().set(reference, value, ex=CLAIM_CHECK_TTL)
+
+    return {CLAIM_CHECK_REFERENCE: reference}
+
+
+def claim_check_load(data: typing.Optional[dict]) -> typing.Optional[dict]:
+    """
+    Decode the API response stored by `claim_check_store` if the data is a reference to a stored response.
+
+    Data that is not a reference is returned as-is, so linked tasks can accept the results of `tornget` with and without
+    `claim_check`. The stored response is not deleted as the reference can be passed to multiple linked tasks (e.g.
+    through a group) and is instead expired.
+
+    Parameters
+    ----------
+    data : dict, optional
+        Result of `tornget`
+
+    Returns
+    -------
+    response : dict, optional
+        Decoded API response
+
+    Raises
+    ------
+    ValueError
+        If the referenced response has expired
+    """
+
+    if not isinstance(data, dict) or CLAIM_CHECK_REFERENCE not in data:
+        return data
+
+    value: typing.Optional[bytes] = rds().execute_command("GET", data[CLAIM_CHECK_REFERENCE], **{NEVER_DECODE: []})
+
+    if value is None:
+        raise ValueError(f"Claim check {data[CLAIM_CHECK_REFERENCE]} has expired")
+    elif value[:1] == b"z":
+        return loads(zlib.decompress(value[1:]))
+
+    return loads(value[1:])
+
+
 @celery.shared_task(name="tasks.api.tornget", time_limit=5, routing_key="api.tornget", queue="api")
 @with_db_connection
-def tornget(endpoint, key, tots=0, fromts=0, stat="", session=None, pass_error=False, version=1):
+def tornget(endpoint, key, tots=0, fromts=0, stat="", session=None, pass_error=False, version=1, claim_check=False):
     url = (
         f'{config.torn_api_uri}v{version}/{endpoint}&key={key}&comment=Tornium{"" if fromts == 0 else f"&from={fromts}"}'
         f'{"" if tots == 0 else f"&to={tots}"}{stat if stat == "" else f"&stat={stat}"}'
@@ -74,37 +266,26 @@ def tornget(endpoint, key, tots=0, fromts=0, stat="", session=None, pass_error=F
     if key is None or key == "":
         raise MissingKeyError
 
-    redis_client = rds()
-    redis_key = f"tornium:torn-ratelimit:{key}"
-    ttl = 60 - datetime.datetime.utcnow().second
-
-    redis_client.set(redis_key, 50, nx=True, ex=ttl)
-
-    try:
-        if int(redis_client.get(redis_key)) > 0:
-            redis_client.decrby(redis_key, 1)
-            redis_client.expire(redis_key, ttl, nx=True)
-        else:
-            if redis_client.ttl(redis_key) == -1:
-                redis_client.set(redis_key, 1, ex=ttl)
+    if not consume_tokens(f"{TORN_RATELIMIT_KEY_PREFIX}:{key}", TORN_RATELIMIT).allowed:
+        raise RatelimitError
 
-            raise RatelimitError
-    except TypeError:
-        redis_client.set(redis_key, 50, nx=True, ex=ttl)
+    if session is None:
+        session = http_session()
 
     try:
-        if session is None:
-            request = requests.get(url, timeout=5)
-        else:
-            request = session.get(url, timeout=5)
+        request = session.get(url, timeout=5)
     except requests.exceptions.Timeout:
         raise NetworkingError(code=408, url=url)
+    except requests.exceptions.ConnectionError:
+        raise NetworkingError(code=503, url=url)
 
     if request.status_code // 100 != 2:
         raise NetworkingError(code=request.status_code, url=url)
 
+    content = request.content
+
     if globals().get("orjson:loaded"):
-        request = orjson.loads(request.content)
+        request = orjson.loads(content)
     else:
         request = request.json()
 
@@ -124,10 +305,138 @@ def tornget(endpoint, key, tots=0, fromts=0, stat="", session=None, pass_error=F
         if not pass_error:
             raise TornError(code=request["error"]["code"], endpoint=url)
 
+    if claim_check:
+        return claim_check_store(content)
+
     return request
 
 
-def discord_do(method, endpoint, body=None):
+def _torn_cache_selections(endpoint: str) -> typing.Optional[typing.List[str]]:
+    path, _, query = endpoint.partition("?")
+    resource, _, resource_id = path.partition("/")
+
+    if resource_id.strip("/") == "":
+        # Endpoints without an explicit ID return data relative to the API key's owner, so the response can not be
+        # shared between API keys
+        return None
+
+    return urllib.parse.parse_qs(query, keep_blank_values=True).get("selections", [""])[0].split(",")
+
+
+def _torn_cache_ttl(endpoint: str) -> typing.Optional[int]:
+    selections = _torn_cache_selections(endpoint)
+
+    if selections is None:
+        return None
+
+    return min(TORN_CACHE_TTLS.get(selection, TORN_CACHE_DEFAULT_TTL) for selection in selections)
+
+
+def _torn_cache_scoped(endpoint: str, version: int) -> bool:
+    selections = _torn_cache_selections(endpoint)
+
+    if selections is None:
+        return False
+
+    return any(selection in TORN_CACHE_SCOPED_SELECTIONS.get(version, set()) for selection in selections)
+
+
+def _torn_cache_key(key: typing.Union[str, typing.Callable[[], str]]) -> str:
+    return key() if callable(key) else key
+
+
+def coalesced_tornget(
+    endpoint: str,
+    key: typing.Union[str, typing.Callable[[], str]],
+    version: int = 1,
+    ttl: typing.Optional[int] = None,
+    scope: typing.Optional[str] = None,
+) -> dict:
+    """
+    Perform a Torn API call shared between concurrent identical requests.
+
+    Concurrent calls to the same endpoint and selections are coalesced into a single call to the Torn API regardless of
+    the API key used, and the decoded response is cached in Redis for a short TTL depending on the selections. This
+    avoids each caller spending their own API key's ratelimit on the same data (e.g. when multiple faction members
+    run the same slash command at once).
+
+    The endpoint must include the ID of the resource (e.g. `faction/{faction_id}?selections=basic`) for the response
+    to be shared; otherwise the call is passed through to `tornget`. Callers are responsible for verifying the user
+    is permitted to access the data as the cached data could have been retrieved with another user's API key.
+
+    Responses of selections depending on the API key's owner (see `TORN_CACHE_SCOPED_SELECTIONS`) are only shared
+    between callers of the same `scope` (e.g. the API keys of a faction's members). Without a scope, these responses
+    are only shared between calls using the same API key.
+
+    Parameters
+    ----------
+    endpoint : str
+        Torn API endpoint including the resource ID and selections
+    key : str or Callable
+        API key to use if the API call is performed by this caller, or a function returning the API key that is only
+        called when the API call is performed (e.g. `lambda: choose_torn_key(keys)` to avoid spending the ratelimit
+        of an API key on a cached response)
+    version : int
+        Version of the Torn API
+    ttl : int, optional
+        Number of seconds to cache the response for; defaults to the TTL of the endpoint's selections
+    scope : str, optional
+        Scope the response is shared within if the response depends on the API key's owner
+
+    Returns
+    -------
+    response : dict
+        Decoded response from the Torn API
+    """
+
+    global _torn_cache_unlock_script
+
+    if ttl is None:
+        ttl = _torn_cache_ttl(endpoint)
+
+        if ttl is None:
+            return tornget(endpoint, _torn_cache_key(key), version=version)
+
+    cache_key = f"tornium:torn-cache:v{version}:{endpoint}"
+
+    if _torn_cache_scoped(endpoint, version):
+        if scope is None:
+            key = _torn_cache_key(key)
+            scope = "key:" + hashlib.sha1(key.encode()).hexdigest()
+
+        cache_key = f"{cache_key}:{scope}"
+
+    lock_key = f"{cache_key}:lock"
+    lock_token = uuid.uuid4().hex
+    redis_client = rds()
+
+    if _torn_cache_unlock_script is None:
+        _torn_cache_unlock_script = redis_client.register_script(_TORN_CACHE_UNLOCK_SCRIPT)
+
+    deadline = time.monotonic() + TORN_CACHE_WAIT_TIMEOUT
+    while True:
+        cached_response = redis_client.get(cache_key)
+
+        if cached_response is not None:
+            return loads(cached_response)
+        elif redis_client.set(lock_key, lock_token, nx=True, ex=TORN_CACHE_LOCK_TIMEOUT):
+            break
+        elif time.monotonic() >= deadline:
+            # The caller performing the API call has stalled or failed, so the API call is performed without the lock
+            return tornget(endpoint, _torn_cache_key(key), version=version)
+
+        time.sleep(0.05)
+
+    try:
+        response = tornget(endpoint, _torn_cache_key(key), version=version)
+        redis_client.set(cache_key, dumps(response), ex=ttl)
+    finally:
+        _torn_cache_unlock_script(keys=[lock_key], args=[lock_token], client=redis_client)
+
+    return response
+
+
+def discord_do(method, endpoint, body=None, timeout=None):
     payload = {"method": method, "endpoint": "/" + endpoint}
 
     if body is not None:
@@ -138,7 +447,9 @@ def discord_do(method, endpoint, body=None):
     else:
         payload = json.dumps(payload)
 
-    return requests.post("http://localhost:4000/discord", headers={"Content-Type": "application/json"}, data=payload)
+    return http_session().post(
+        DISCORD_PROXY_URL, headers={"Content-Type": "application/json"}, data=payload, timeout=timeout
+    )
 
 
 @celery.shared_task(
@@ -335,6 +646,201 @@ def discorddelete(self, endpoint, *args, **kwargs):
     return request_json
 
 
+def merge_discord_messages(payloads: typing.Iterable[dict]) -> typing.List[dict]:
+    """
+    Merge consecutive message payloads into as few messages as possible within Discord's message limits.
+
+    Only payloads consisting of content, embeds, and components are merged; other payloads (e.g. with allowed mentions
+    or attachments) are sent as-is. Identical content (e.g. the same role pings) is only included once in each merged
+    message.
+
+    Parameters
+    ----------
+    payloads : iterable of dict
+        Message payloads in the order they were queued
+
+    Returns
+    -------
+    messages : list of dict
+        Merged message payloads in the order they should be sent
+    """
+
+    messages: typing.List[dict] = []
+    mergeable = False
+
+    for payload in payloads:
+        if not set(payload.keys()) <= {"content", "embeds", "components"}:
+            messages.append(payload)
+            mergeable = False
+            continue
+
+        embeds = payload.get("embeds") or []
+        components = payload.get("components") or []
+        content = payload.get("content") or ""
+
+        if mergeable:
+            message = messages[-1]
+            merged_content = message.get("content", "")
+
+            if content != "" and content not in merged_content.split("\n"):
+                merged_content = content if merged_content == "" else f"{merged_content}\n{content}"
+
+            if (
+                len(message["embeds"]) + len(embeds) <= DISCORD_MAX_EMBEDS
+                and len(message["components"]) + len(components) <= DISCORD_MAX_ACTION_ROWS
+                and len(merged_content) <= DISCORD_MAX_CONTENT_LENGTH
+            ):
+                message["embeds"].extend(embeds)
+                message["components"].extend(components)
+
+                if merged_content != "":
+                    message["content"] = merged_content
+
+                continue
+
+        message = {"embeds": list(embeds), "components": list(components)}
+
+        if content != "":
+            message["content"] = content
+
+        messages.append(message)
+        mergeable = True
+
+    return messages
+
+
+def _schedule_discord_outbound(channel_id: int, countdown: float, force: bool = False) -> None:
+    scheduled_key = f"{DISCORD_OUTBOUND_KEY}:{channel_id}:scheduled"
+
+    # The scheduled key ensures that only one drain task is scheduled for each channel at a time so that each
+    # channel's messages are sent in order; the key expires in case the drain task is lost
+    if force:
+        rds().set(scheduled_key, 1, ex=math.ceil(countdown) + 60)
+    elif not rds().set(scheduled_key, 1, nx=True, ex=math.ceil(countdown) + 60):
+        return
+
+    drain_discord_outbound.signature(kwargs={"channel_id": channel_id}, queue="api").apply_async(
+        countdown=countdown, ignore_result=True
+    )
+
+
+def queue_discord_message(channel_id: int, payload: dict) -> None:
+    """
+    Queue a message to be sent to a channel by `drain_discord_outbound`.
+
+    Messages queued for the same channel within `DISCORD_OUTBOUND_WINDOW` seconds are merged into as few messages as
+    possible and the channel's messages are sent in order while respecting the channel's ratelimit. This should be used
+    for alerts that can be merged and don't require the ID of the sent message.
+
+    Parameters
+    ----------
+    channel_id : int
+        ID of the Discord channel
+    payload : dict
+        Message payload
+    """
+
+    rds().rpush(f"{DISCORD_OUTBOUND_KEY}:{channel_id}", dumps(payload))
+    _schedule_discord_outbound(channel_id, DISCORD_OUTBOUND_WINDOW)
+
+
+def _discord_retry_after(response: requests.Response) -> typing.Optional[float]:
+    # Returns the number of seconds until the channel's ratelimit bucket resets if the bucket has been exhausted
+    if response.status_code == 429:
+        try:
+            return float(response.json()["retry_after"])
+        except Exception:
+            return float(response.headers.get("Retry-After", 1))
+    elif response.headers.get("X-RateLimit-Remaining") == "0" and "X-RateLimit-Reset-After" in response.headers:
+        return float(response.headers["X-RateLimit-Reset-After"])
+
+    return None
+
+
+@celery.shared_task(
+    name="tasks.api.drain_discord_outbound",
+    routing_key="api.drain_discord_outbound",
+    queue="api",
+    time_limit=15,
+)
+def drain_discord_outbound(channel_id: int):
+    redis_client = rds()
+    queue_key = f"{DISCORD_OUTBOUND_KEY}:{channel_id}"
+    processing_key = f"{queue_key}:processing"
+    ratelimit_key = f"{queue_key}:ratelimit"
+
+    ratelimit_ttl = redis_client.pttl(ratelimit_key)
+
+    if ratelimit_ttl > 0:
+        _schedule_discord_outbound(channel_id, ratelimit_ttl / 1000, force=True)
+        return
+
+    # Messages are moved to the channel's processing list while they are being sent and are only removed once sent,
+    # so messages of a run that was killed or failed are sent by the next run instead of being lost
+    payloads = redis_client.lrange(processing_key, 0, -1)
+
+    if len(payloads) == 0:
+        pipeline = redis_client.pipeline()
+        for _ in range(DISCORD_OUTBOUND_BATCH_SIZE):
+            pipeline.lmove(queue_key, processing_key, "LEFT", "RIGHT")
+        payloads = [payload for payload in pipeline.execute() if payload is not None]
+
+    messages = merge_discord_messages(loads(payload) for payload in payloads)
+
+    # The number of messages sent per run is bounded so that a busy channel can not occupy a worker for long periods
+    sent = 0
+    retry_after: typing.Optional[float] = None
+
+    while sent < min(len(messages), DISCORD_OUTBOUND_SENDS_PER_RUN):
+        try:
+            response = discord_do(
+                "POST", f"channels/{channel_id}/messages", messages[sent], timeout=DISCORD_OUTBOUND_SEND_TIMEOUT
+            )
+        except requests.exceptions.RequestException as e:
+            logger.exception(e)
+            retry_after = 1
+            break
+
+        retry_after = _discord_retry_after(response)
+
+        if response.status_code == 429:
+            break
+        elif response.status_code // 100 != 2:
+            logger.warning(f"Failed to send queued message to channel {channel_id}: {response.text}")
+
+        sent += 1
+
+        # The processing list only keeps the messages that have not been sent yet
+        pipeline = redis_client.pipeline(transaction=True)
+        pipeline.delete(processing_key)
+        if sent < len(messages):
+            pipeline.rpush(processing_key, *(dumps(unsent) for unsent in messages[sent:]))
+        pipeline.execute()
+
+        if retry_after is not None:
+            break
+
+    if retry_after is not None:
+        redis_client.set(ratelimit_key, 1, px=max(math.ceil(retry_after * 1000), 1))
+
+    if sent < len(messages):
+        # Unsent messages are returned to the front of the channel's queue to be sent in order
+        pipeline = redis_client.pipeline(transaction=True)
+        pipeline.lpush(queue_key, *(dumps(unsent) for unsent in reversed(messages[sent:])))
+        pipeline.delete(processing_key)
+        pipeline.execute()
+
+        _schedule_discord_outbound(channel_id, retry_after or 0, force=True)
+        return
+
+    # Messages queued after the queue was popped will have not scheduled another drain task as the scheduled key still
+    # existed, so the queue is checked again after removing the scheduled key
+    redis_client.delete(f"{queue_key}:scheduled")
+
+    if redis_client.llen(queue_key) != 0:
+        _schedule_discord_outbound(channel_id, 0)
+
+
 @celery.shared_task(
     name="tasks.api.torn_stats_get",
     time_limit=15,
@@ -343,27 +849,19 @@ def discorddelete(self, endpoint, *args, **kwargs):
 )
 def torn_stats_get(endpoint, key, session=None):
     url = f"https://www.tornstats.com/api/v2/{key}/{endpoint}"
-    redis_key = f"tornium:ts-ratelimit:{key}"
-    redis_client = rds()
-
-    redis_client.set(redis_key, 15, nx=True, ex=60 - datetime.datetime.utcnow().second)
 
-    if redis_client.ttl(redis_key) < 1:
-        redis_client.expire(redis_key, 1)
-        redis_client.set(redis_key, 50, nx=True, ex=60 - datetime.datetime.utcnow().second)
-
-    if int(redis_client.get(redis_key)) > 0:
-        redis_client.decrby(redis_key, 1)
-    else:
+    if not consume_tokens(f"{TORN_STATS_RATELIMIT_KEY_PREFIX}:{key}", TORN_STATS_RATELIMIT).allowed:
         raise RatelimitError
 
+    if session is None:
+        session = http_session()
+
     try:
-        if session is None:
-            request = requests.get(url, timeout=15)
-        else:
-            request = session.get(url, timeout=15)
+        request = session.get(url, timeout=15)
     except requests.exceptions.Timeout:
         raise NetworkingError(code=408, url=url)
+    except requests.exceptions.ConnectionError:
+        raise NetworkingError(code=503, url=url)
 
     if request.status_code // 100 != 2:
         raise NetworkingError(code=request.status_code, url=url)
@@ -16,16 +16,15 @@
 import datetime
 import inspect
 import math
-import random
 import re
 import time
 import typing
 import urllib.parse
 from decimal import DivisionByZero
 
-from peewee import JOIN, DoesNotExist
+from peewee import JOIN, DoesNotExist, fn
 from tornium_commons import with_db_connection
-from tornium_commons.errors import DiscordError, NetworkingError
+from tornium_commons.errors import DiscordError, NetworkingError, RatelimitError
 from tornium_commons.formatters import (
     LinkHTMLParser,
     bs_to_range,
@@ -46,14 +45,25 @@ from tornium_commons.models import (
     User,
     Withdrawal,
 )
+from tornium_commons.ratelimit import (
+    TORN_INTERACTIVE_RESERVE,
+    choose_torn_key,
+    torn_key_utilization,
+)
 from tornium_commons.skyutils import SKYNET_ERROR, SKYNET_GOOD
 
 import celery
 from celery.utils.log import get_task_logger
 
-from .api import discordpatch, discordpost, tornget
+from .api import (
+    claim_check_load,
+    discordpatch,
+    discordpost,
+    queue_discord_message,
+    tornget,
+)
 from .misc import send_dm
-from .user import update_user
+from .user import queue_user_refresh, upsert_attack_stats
 
 logger = get_task_logger("celery_app")
 
@@ -110,36 +120,47 @@ def update_faction_ts(faction_ts_data):
 )
 @with_db_connection
 def fetch_attacks_runner():
-    for api_key in (
-        TornKey.select().distinct(TornKey.user.faction.tid).join(User).join(Faction).where(TornKey.default == True)
-    ):
-        if api_key.user.faction is None:
-            continue
-
-        faction: typing.Optional[Faction] = Faction.select().where(Faction.tid == api_key.user.faction.tid).first()
+    # Each faction is retrieved along with the default API keys of its AA members within a single query instead of
+    # separately retrieving each faction and its AA keys
+    stale_factions: typing.List[int] = []
+
+    factions: typing.List[typing.Tuple[int, typing.Optional[datetime.datetime], typing.List[str]]] = list(
+        Faction.select(Faction.tid, Faction.last_attacks, fn.array_agg(TornKey.api_key))
+        .join(User, on=(User.faction == Faction.tid))
+        .join(TornKey, on=(TornKey.user == User.tid))
+        .where((User.faction_aa == True) & (TornKey.default == True))
+        .group_by(Faction.tid)
+        .tuples()
+    )
+    utilization = torn_key_utilization(api_key for _, _, aa_keys in factions for api_key in aa_keys)
 
-        if faction is None:
-            continue
-        elif len(faction.aa_keys) == 0:
+    faction_id: int
+    faction_last_attacks: typing.Optional[datetime.datetime]
+    aa_keys: typing.List[str]
+    for faction_id, faction_last_attacks, aa_keys in factions:
+        if len(aa_keys) == 0:
             continue
-        elif faction.last_attacks is None or timestamp(faction.last_attacks) == 0:
-            # TODO: Convert to an atomic update
-            faction.last_attacks = datetime.datetime.utcnow()
-            faction.save()
+        elif faction_last_attacks is None or timestamp(faction_last_attacks) == 0:
+            stale_factions.append(faction_id)
             continue
-        elif time.time() - timestamp(faction.last_attacks) > 86401:  # One day
+        elif time.time() - timestamp(faction_last_attacks) > 86401:  # One day
             # Prevents old data from being added (especially for retals)
-            # TODO: Convert to an atomic update
-            faction.last_attacks = datetime.datetime.utcnow()
-            faction.save()
+            stale_factions.append(faction_id)
             continue
 
-        last_attacks: int = timestamp(faction.last_attacks)
+        try:
+            api_key = choose_torn_key(aa_keys, reserve=TORN_INTERACTIVE_RESERVE, utilization=utilization)
+        except RatelimitError:
+            # The faction's attacks will be retrieved from the last retrieved attack during the next run
+            continue
+
+        last_attacks: int = timestamp(faction_last_attacks)
 
         tornget.signature(
             kwargs={
                 "endpoint": f"faction/?selections=basic,attacks&timestamp={int(time.time())}",
-                "key": random.choice(faction.aa_keys),
+                "key": api_key,
+                "claim_check": True,
             },
             queue="api",
         ).apply_async(
@@ -156,40 +177,71 @@ def fetch_attacks_runner():
             ),
         )
 
-    retal: Retaliation
-    for retal in Retaliation.select().where(
-        (Retaliation.attack_ended <= (datetime.datetime.utcnow() - datetime.timedelta(minutes=5)))
-        & (Retaliation.channel_id.is_null(False))
-        & (Retaliation.message_id.is_null(False))
-    ):
-        # Runs at 6 minutes after to allow API calls to be made if the attack is made close to timeout
-        # TODO: Convert to a delete returning query
-        try:
-            discordpatch.s(
-                f"channels/{retal.channel_id}/messages/{retal.message_id}",
-                {
-                    "embeds": [
-                        {
-                            "title": f"Retal Timeout for {retal.defender.faction.name}",
-                            "description": (
-                                f"{retal.attacker.user_str_self()} of "
-                                f"{'N/A' if retal.attacker.faction is None else retal.attacker.faction.name} has attacked "
-                                f"{retal.defender.user_str_self()}, but the retaliation timed out "
-                                f"<t:{int(timestamp(retal.attack_ended) + 300)}:R>"
-                            ),
-                            "color": SKYNET_ERROR,
-                        }
-                    ],
-                    "components": [],
-                },
-            ).apply_async(ignore_result=True)
-        except Exception as e:
-            logger.exception(e)
-            continue
+    if len(stale_factions) != 0:
+        Faction.update(last_attacks=datetime.datetime.utcnow()).where(Faction.tid << stale_factions).execute()
+
+    # Retaliations are timed out at six minutes after the attack to allow for the API calls of attacks made close to
+    # the timeout to complete the retaliation
+    expired_retals: typing.List[Retaliation] = list(
+        Retaliation.delete()
+        .where(Retaliation.attack_ended <= (datetime.datetime.utcnow() - datetime.timedelta(minutes=6)))
+        .returning(
+            Retaliation.attacker,
+            Retaliation.defender,
+            Retaliation.attack_ended,
+            Retaliation.channel_id,
+            Retaliation.message_id,
+        )
+    )
+    expired_retals = [
+        retal for retal in expired_retals if retal.channel_id is not None and retal.message_id is not None
+    ]
 
-    Retaliation.delete().where(
-        Retaliation.attack_ended <= (datetime.datetime.utcnow() - datetime.timedelta(minutes=6))
-    ).execute()
+    if len(expired_retals) == 0:
+        return
+
+    user_ids: typing.Set[int] = {retal.attacker_id for retal in expired_retals}
+    user_ids.update(retal.defender_id for retal in expired_retals)
+    users: typing.Dict[int, typing.Tuple[str, typing.Optional[str]]] = {
+        user_id: (user_name, faction_name)
+        for user_id, user_name, faction_name in User.select(User.tid, User.name, Faction.name)
+        .join(Faction, JOIN.LEFT_OUTER, on=(User.faction == Faction.tid))
+        .where(User.tid << list(user_ids))
+        .tuples()
+    }
+
+    def _user_str(user_id: int) -> str:
+        return f"{users.get(user_id, ('Unknown', None))[0]} [{user_id}]"
+
+    def _faction_name(user_id: int) -> str:
+        return users.get(user_id, (None, None))[1] or "N/A"
+
+    try:
+        celery.group(
+            discordpatch.signature(
+                args=(
+                    f"channels/{retal.channel_id}/messages/{retal.message_id}",
+                    {
+                        "embeds": [
+                            {
+                                "title": f"Retal Timeout for {_faction_name(retal.defender_id)}",
+                                "description": (
+                                    f"{_user_str(retal.attacker_id)} of {_faction_name(retal.attacker_id)} has "
+                                    f"attacked {_user_str(retal.defender_id)}, but the retaliation timed out "
+                                    f"<t:{int(timestamp(retal.attack_ended) + 300)}:R>"
+                                ),
+                                "color": SKYNET_ERROR,
+                            }
+                        ],
+                        "components": [],
+                    },
+                ),
+                immutable=True,
+            )
+            for retal in expired_retals
+        ).apply_async(ignore_result=True)
+    except Exception as e:
+        logger.exception(e)
 
 
 @celery.shared_task(
@@ -200,6 +252,8 @@ def fetch_attacks_runner():
 )
 @with_db_connection
 def stat_db_attacks(faction_data: dict, last_attacks: int):
+    faction_data = claim_check_load(faction_data)
+
     if len(faction_data.get("attacks", [])) == 0:
         return
 
@@ -223,6 +277,13 @@ def stat_db_attacks(faction_data: dict, last_attacks: int):
     if not faction.stats_db_enabled:
         return
 
+    # User: faction member
+    # Opponent: non-faction member regardless of attack or defend
+    #
+    # The attacks are first filtered and then the faction members' battlescores are retrieved in a single query to
+    # avoid querying the database for each attack.
+    qualifying_attacks: typing.List[typing.Tuple[dict, str, str]] = []
+
     attack: dict
     for attack in faction_data["attacks"].values():
         if attack["result"] in [
@@ -253,88 +314,57 @@ def stat_db_attacks(faction_data: dict, last_attacks: int):
         elif attack["timestamp_ended"] <= last_attacks + 1:
             continue
 
-        # User: faction member
-        # Opponent: non-faction member regardless of attack or defend
-
         if attack["defender_faction"] == faction_data["ID"]:  # Defender fac is the fac making the call
             if attack["attacker_id"] in ("", 0):  # Attacker stealthed
                 continue
             elif attack["respect"] == 0:  # Attack by fac member
                 continue
 
-            user: typing.Optional[User] = (
-                User.select(User.battlescore, User.battlescore_update, User.faction)
-                .where(User.tid == attack["defender_id"])
-                .first()
-            )
+            qualifying_attacks.append((attack, "defender", "attacker"))
+        else:  # User is the attacker
+            qualifying_attacks.append((attack, "attacker", "defender"))
 
-            if user is None or user.battlescore in (None, 0):
-                continue
-            elif (
-                user.battlescore_update is None or int(time.time()) - timestamp(user.battlescore_update) > 259200
-            ):  # Three days
-                continue
+    if len(qualifying_attacks) == 0:
+        return
 
-            opponent_id = attack["attacker_id"]
-
-            if attack["attacker_faction"] != 0:
-                Faction.insert(
-                    tid=attack["attacker_faction"],
-                    name=attack["attacker_factionname"],
-                ).on_conflict(
-                    conflict_target=[Faction.tid],
-                    preserve=[Faction.name],
-                ).execute()
-
-            User.insert(
-                tid=attack["attacker_id"],
-                name=attack["attacker_name"],
-                faction=(attack["attacker_faction"] if attack["attacker_faction"] != 0 else None),
-            ).on_conflict(
-                conflict_target=[User.tid],
-                preserve=[User.name, User.faction],
-            ).execute()
-        else:  # User is the attacker
-            user: typing.Optional[User] = (
-                User.select(User.battlescore, User.battlescore_update, User.faction)
-                .where(User.tid == attack["attacker_id"])
-                .first()
-            )
+    users: typing.Dict[int, User] = {
+        user.tid: user
+        for user in User.select(User.tid, User.battlescore, User.battlescore_update, User.faction).where(
+            User.tid << list({attack[f"{user_side}_id"] for attack, user_side, _ in qualifying_attacks})
+        )
+    }
 
-            if user is None or user.battlescore in (None, 0):
-                continue
-            elif (
-                user.battlescore_update is None or int(time.time()) - timestamp(user.battlescore_update) > 259200
-            ):  # Three days
-                continue
+    opponents: typing.Dict[int, dict] = {}
+    factions: typing.Dict[int, dict] = {}
+    stats: typing.Dict[typing.Tuple[int, datetime.datetime, int], dict] = {}
 
-            opponent_id = attack["defender_id"]
-
-            if attack["defender_faction"] != 0:
-                Faction.insert(
-                    tid=attack["defender_faction"],
-                    name=attack["defender_factionname"],
-                ).on_conflict(
-                    conflict_target=[Faction.tid],
-                    preserve=[Faction.name],
-                ).execute()
-
-            User.insert(
-                tid=attack["defender_id"],
-                name=attack["defender_name"],
-                faction=(attack["defender_faction"] if attack["defender_faction"] != 0 else None),
-            ).on_conflict(
-                conflict_target=[User.tid],
-                preserve=[User.name, User.faction],
-            ).execute()
+    for attack, user_side, opponent_side in qualifying_attacks:
+        user: typing.Optional[User] = users.get(attack[f"{user_side}_id"])
 
-        try:
-            update_user.s(tid=opponent_id, key=random.choice(faction.aa_keys)).apply_async(ignore_result=True)
-        except IndexError:
-            pass
+        if user is None or user.battlescore in (None, 0):
+            continue
+        elif (
+            user.battlescore_update is None or int(time.time()) - timestamp(user.battlescore_update) > 259200
+        ):  # Three days
+            continue
+
+        opponent_id = attack[f"{opponent_side}_id"]
+        opponent_faction_id = attack[f"{opponent_side}_faction"]
+
+        if opponent_faction_id != 0:
+            factions[opponent_faction_id] = {
+                "tid": opponent_faction_id,
+                "name": attack[f"{opponent_side}_factionname"],
+            }
+
+        opponents[opponent_id] = {
+            "tid": opponent_id,
+            "name": attack[f"{opponent_side}_name"],
+            "faction": opponent_faction_id if opponent_faction_id != 0 else None,
+        }
 
         try:
-            if attack["defender_faction"] == faction_data["ID"]:
+            if user_side == "defender":
                 opponent_score = user.battlescore / ((attack["modifiers"]["fair_fight"] - 1) * 0.375)
             else:
                 opponent_score = (attack["modifiers"]["fair_fight"] - 1) * 0.375 * user.battlescore
@@ -344,30 +374,34 @@ def stat_db_attacks(faction_data: dict, last_attacks: int):
         if opponent_score == 0:
             continue
 
-        if (
-            Stat.select()
-            .where(
-                (Stat.tid == opponent_id)
-                & (
-                    Stat.time_added
-                    == datetime.datetime.fromtimestamp(attack["timestamp_ended"], tz=datetime.timezone.utc)
-                )
-                & (Stat.added_group == (0 if faction.stats_db_global else user.faction_id))
-            )
-            .exists()
-        ):
-            continue
+        time_added = datetime.datetime.fromtimestamp(attack["timestamp_ended"], tz=datetime.timezone.utc)
+        added_group = 0 if faction.stats_db_global else user.faction_id
+        stats[(opponent_id, time_added, added_group)] = {
+            "tid": opponent_id,
+            "battlescore": opponent_score,
+            "time_added": time_added,
+            "added_group": added_group,
+        }
 
-        try:
-            Stat.create(
-                tid=opponent_id,
-                battlescore=opponent_score,
-                time_added=datetime.datetime.fromtimestamp(attack["timestamp_ended"], tz=datetime.timezone.utc),
-                added_group=0 if faction.stats_db_global else user.faction_id,
-            )
-        except Exception as e:
-            logger.exception(e)
-            continue
+    try:
+        upsert_attack_stats(opponents, factions, stats)
+    except Exception as e:
+        logger.exception(e)
+
+    aa_keys = faction.aa_keys
+
+    if len(aa_keys) != 0:
+        # The refreshes are spread across the AA keys starting with the keys with the most remaining calls as
+        # `refresh_pending_users` defers refreshes exceeding each key's remaining calls
+        utilization = torn_key_utilization(aa_keys)
+        user_keys: typing.Dict[int, str] = {}
+
+        for opponent_id in opponents:
+            api_key = min(aa_keys, key=utilization.__getitem__)
+            user_keys[opponent_id] = api_key
+            utilization[api_key] += 1
+
+        queue_user_refresh(user_keys)
 
 
 def validate_attack_retaliation(attack: dict, faction: Faction) -> bool:
@@ -701,6 +735,8 @@ def validate_attack_bonus(attack: dict, faction: Faction, attack_config: ServerA
 )
 @with_db_connection
 def check_attacks(faction_data: dict, last_attacks: int):
+    faction_data = claim_check_load(faction_data)
+
     if len(faction_data.get("attacks", [])) == 0:
         return
 
@@ -740,6 +776,7 @@ def check_attacks(faction_data: dict, last_attacks: int):
         ALERT_CHAIN_ALERT = attack_config.chain_alert_channel not in (None, 0)
 
     possible_retals = {}
+    completing_attacks: typing.Dict[int, dict] = {}
     latest_outgoing_attack: typing.Optional[typing.Tuple[int, int]] = None
 
     for attack in faction_data["attacks"].values():
@@ -776,50 +813,20 @@ def check_attacks(faction_data: dict, last_attacks: int):
         if ALERT_RETALS and validate_attack_retaliation(attack, faction):
             # TODO: Check possible_retals if the retaliation attack data is in the same API response as the original attack
 
-            retal: Retaliation
-            for retal in (
-                Retaliation.delete()
-                .where(
-                    (Retaliation.attacker == attack["defender_id"])
-                    & (Retaliation.defender << (User.select().where(User.faction == attack["attacker_faction"])))
-                    & (Retaliation.channel_id.is_null(False))
-                    & (Retaliation.message_id.is_null(False))
-                )
-                .returning(Retaliation.channel_id, Retaliation.message_id)
-            ):
-                discordpatch.s(
-                    f"channels/{retal.channel_id}/messages/{retal.message_id}",
-                    {
-                        "embeds": [
-                            {
-                                "title": f"Retal Completed for {faction.name}",
-                                "description": (
-                                    f"{attack['attacker_name']} [{attack['attacker_id']}] hospitalized {attack['defender_name']} [{attack['defender_id']}] (+{attack['respect_gain']})."
-                                ),
-                                "color": SKYNET_GOOD,
-                            }
-                        ],
-                        "components": [],
-                    },
-                ).apply_async(ignore_result=True)
+            # The retaliations completed by the attacks are removed after all attacks are checked; the first attack
+            # upon each user completes the user's retaliations
+            completing_attacks.setdefault(attack["defender_id"], attack)
         elif (
             ALERT_RETALS
             and validate_attack_available_retaliation(attack, faction)
             and (attack_config.retal_wars or attack["modifiers"]["war"] == 1)
         ):
-            try:
-                possible_retals[attack["code"]] = {
-                    "task": discordpost.delay(
-                        f"channels/{attack_config.retal_channel}/messages",
-                        payload=generate_retaliation_embed(attack, faction, attack_config, faction_data),
-                    ),
-                    **attack,
-                }
-            except Exception as e:
-                logger.exception(e)
-                pass
+            possible_retals[attack["code"]] = {
+                "payload": generate_retaliation_embed(attack, faction, attack_config, faction_data),
+                **attack,
+            }
         elif validate_attack_available_retaliation(attack, faction):
-            possible_retals[attack["code"]] = {"task": None, **attack}
+            possible_retals[attack["code"]] = {"payload": None, **attack}
 
         # Check for bonuses dropped upon this faction
         if ALERT_CHAIN_BONUS and validate_attack_bonus(attack, faction, attack_config):
@@ -867,10 +874,7 @@ def check_attacks(faction_data: dict, last_attacks: int):
 
                 payload["content"] += f"<@&{role}>"
 
-            discordpost.s(
-                f"channels/{attack_config.chain_bonus_channel}/messages",
-                payload=payload,
-            ).apply_async(ignore_result=True)
+            queue_discord_message(attack_config.chain_bonus_channel, payload)
 
     if (
         latest_outgoing_attack is not None
@@ -897,28 +901,93 @@ def check_attacks(faction_data: dict, last_attacks: int):
 
             payload["content"] += f"<@&{role}>"
 
-        discordpost.s(f"channels/{attack_config.chain_alert_channel}/messages", payload=payload).apply_async(
-            ignore_result=True
+        queue_discord_message(attack_config.chain_alert_channel, payload)
+
+    if len(completing_attacks) != 0:
+        # As retaliation attacks are outgoing attacks by this faction, the retaliations of all attacks can be completed
+        # with a single query
+        retal: Retaliation
+        for retal in (
+            Retaliation.delete()
+            .where(
+                (Retaliation.attacker << list(completing_attacks.keys()))
+                & (Retaliation.defender << (User.select(User.tid).where(User.faction == faction.tid)))
+                & (Retaliation.channel_id.is_null(False))
+                & (Retaliation.message_id.is_null(False))
+            )
+            .returning(Retaliation.attacker, Retaliation.channel_id, Retaliation.message_id)
+        ):
+            attack = completing_attacks[retal.attacker_id]
+
+            discordpatch.s(
+                f"channels/{retal.channel_id}/messages/{retal.message_id}",
+                {
+                    "embeds": [
+                        {
+                            "title": f"Retal Completed for {faction.name}",
+                            "description": (
+                                f"{attack['attacker_name']} [{attack['attacker_id']}] hospitalized {attack['defender_name']} [{attack['defender_id']}] (+{attack['respect_gain']})."
+                            ),
+                            "color": SKYNET_GOOD,
+                        }
+                    ],
+                    "components": [],
+                },
+            ).apply_async(ignore_result=True)
+
+    if len(possible_retals) == 0:
+        return
+
+    # The retaliations are inserted before the retaliation messages are sent so that this task doesn't need to wait
+    # for each message to be sent. The IDs of each message are instead recorded by `record_retaliation_message` once
+    # the message has been sent.
+    inserted_retal: Retaliation
+    for inserted_retal in (
+        Retaliation.insert_many(
+            [
+                {
+                    "attack_code": retal["code"],
+                    "attack_ended": datetime.datetime.fromtimestamp(retal["timestamp_ended"], tz=datetime.timezone.utc),
+                    "defender": retal["defender_id"],
+                    "attacker": retal["attacker_id"],
+                    "message_id": None,
+                    "channel_id": None,
+                }
+                for retal in possible_retals.values()
+            ]
         )
+        .on_conflict_ignore()
+        .returning(Retaliation.attack_code)
+        .execute()
+    ):
+        # Retaliations that were already inserted by a previous run of this task have already been sent
+        retal = possible_retals.get(inserted_retal.attack_code)
+
+        if retal is None or retal["payload"] is None:
+            continue
 
-    for retal in possible_retals.values():
-        retal["task"]: typing.Optional[celery.result.AsyncResult]
         try:
-            message = retal["task"].get(disable_sync_subtasks=False)
-            message_id = message["id"]
-            channel_id = message["channel_id"]
-        except Exception:
-            message_id = None
-            channel_id = None
-
-        Retaliation.insert(
-            attack_code=retal["code"],
-            attack_ended=datetime.datetime.fromtimestamp(retal["timestamp_ended"], tz=datetime.timezone.utc),
-            defender=retal["defender_id"],
-            attacker=retal["attacker_id"],
-            message_id=message_id,
-            channel_id=channel_id,
-        ).on_conflict_ignore().execute()
+            discordpost.s(f"channels/{attack_config.retal_channel}/messages", payload=retal["payload"]).apply_async(
+                link=record_retaliation_message.signature(kwargs={"attack_code": retal["code"]}, queue="quick")
+            )
+        except Exception as e:
+            logger.exception(e)
+
+
+@celery.shared_task(
+    name="tasks.faction.record_retaliation_message",
+    routing_key="quick.record_retaliation_message",
+    queue="quick",
+    time_limit=5,
+)
+@with_db_connection
+def record_retaliation_message(message: typing.Optional[dict], attack_code: str):
+    if message is None or "id" not in message:
+        return
+
+    Retaliation.update(message_id=message["id"], channel_id=message["channel_id"]).where(
+        Retaliation.attack_code == attack_code
+    ).execute()
 
 
 @celery.shared_task(
@@ -949,10 +1018,15 @@ def auto_cancel_requests():
         if len(faction.aa_keys) == 0:
             continue
 
+        try:
+            api_key = choose_torn_key(faction.aa_keys, reserve=TORN_INTERACTIVE_RESERVE)
+        except RatelimitError:
+            continue
+
         tornget.signature(
             kwargs={
                 "endpoint": "faction/?selections=fundsnews,basic",
-                "key": random.choice(faction.aa_keys),
+                "key": api_key,
                 "pass_error": True,
             },
             queue="api",
@@ -1211,49 +1285,55 @@ def verify_faction_withdrawals(funds_news: dict, withdrawals):
 )
 @with_db_connection
 def armory_check():
-    for api_key in (
-        TornKey.select()
-        .distinct(TornKey.user.faction.tid)
-        .join(User)
-        .join(Faction)
-        .where((TornKey.default == True) & (TornKey.user.faction_aa == True))
+    # Each faction with the armory check enabled is retrieved along with its server's armory configuration and the
+    # default API keys of its AA members within a single query
+    factions: typing.List[typing.Tuple[int, str, dict, typing.List[str]]] = []
+
+    for faction_id, faction_name, server_factions, armory_config, aa_keys in (
+        Faction.select(Faction.tid, Faction.name, Server.factions, Server.armory_config, fn.array_agg(TornKey.api_key))
+        .join(Server, on=(Faction.guild == Server.sid))
+        .switch(Faction)
+        .join(User, on=(User.faction == Faction.tid))
+        .join(TornKey, on=(TornKey.user == User.tid))
+        .where((Server.armory_enabled == True) & (User.faction_aa == True) & (TornKey.default == True))
+        .group_by(Faction.tid, Server.sid)
+        .tuples()
     ):
-        faction: typing.Optional[Faction] = Faction.select().where(Faction.tid == api_key.user.faction_id).first()
+        faction_config: typing.Optional[dict] = armory_config.get(str(faction_id))
 
-        if faction is None:
+        if faction_id not in server_factions:
             continue
-        elif len(faction.aa_keys) == 0:
+        elif faction_config is None or not faction_config.get("enabled", False):
             continue
-        try:
-            if faction.guild is None:
-                continue
-        except DoesNotExist:
+        elif faction_config.get("channel", 0) == 0:
             continue
-
-        if faction.tid not in faction.guild.factions:
+        elif len(faction_config.get("items", {})) == 0:
             continue
-        elif not faction.guild.armory_enabled:
-            continue
-        elif str(faction.tid) not in faction.guild.armory_config:
-            continue
-        elif not faction.guild.armory_config[str(faction.tid)].get("enabled", False):
-            continue
-        elif faction.guild.armory_config[str(faction.tid)].get("channel", 0) == 0:
-            continue
-        elif len(faction.guild.armory_config[str(faction.tid)].get("items", {})) == 0:
+
+        factions.append((faction_id, faction_name, faction_config, aa_keys))
+
+    utilization = torn_key_utilization(api_key for _, _, _, aa_keys in factions for api_key in aa_keys)
+
+    for faction_id, faction_name, faction_config, aa_keys in factions:
+        try:
+            api_key = choose_torn_key(aa_keys, reserve=TORN_INTERACTIVE_RESERVE, utilization=utilization)
+        except RatelimitError:
             continue
 
         tornget.signature(
             kwargs={
                 "endpoint": "faction/?selections=armor,boosters,drugs,medical,temporary,utilities,weapons",
-                "key": random.choice(faction.aa_keys),
+                "key": api_key,
+                "claim_check": True,
             },
             queue="api",
         ).apply_async(
             expires=300,
             link=armory_check_subtask.signature(
                 kwargs={
-                    "faction_id": faction.tid,
+                    "faction_id": faction_id,
+                    "faction_name": faction_name,
+                    "faction_config": faction_config,
                 },
                 queue="quick",
             ),
@@ -1267,30 +1347,7 @@ def armory_check():
     time_limit=5,
 )
 @with_db_connection
-def armory_check_subtask(_armory_data, faction_id: int):
-    try:
-        faction: Faction = Faction.select().where(Faction.tid == faction_id).get()
-    except DoesNotExist:
-        return
-
-    if faction.guild is None:
-        return
-    elif faction.tid not in faction.guild.factions:
-        return
-    elif not faction.guild.armory_enabled:
-        return
-    elif str(faction.tid) not in faction.guild.armory_config:
-        return
-
-    faction_config = faction.guild.armory_config[str(faction.tid)]
-
-    if not faction_config.get("enabled", False):
-        return
-    elif faction_config.get("channel", 0) == 0:
-        return
-    elif len(faction_config.get("items", {})) == 0:
-        return
-
+def armory_check_subtask(_armory_data, faction_id: int, faction_name: str, faction_config: dict):
     payload = {
         "content": "".join([f"<@&{role}>" for role in faction_config.get("roles", [])]),
         "embeds": [],
@@ -1315,84 +1372,71 @@ def armory_check_subtask(_armory_data, faction_id: int):
         ],
     }
 
-    in_stock_items: typing.Set[int] = set()
+    _armory_data = claim_check_load(_armory_data)
+    item_catalog = Item.catalog()
 
-    for armory_type in _armory_data:
-        for armory_item in _armory_data[armory_type]:
-            quantity = armory_item.get("available") or armory_item.get("quantity") or 0
-            minimum = faction_config["items"].get(str(armory_item["ID"]))
+    # The quantity of each item in the armory is determined in a single pass over the armory data before being compared
+    # against the configured minimums
+    armory_quantities: typing.Dict[int, int] = {}
+    armory_names: typing.Dict[int, str] = {}
 
-            in_stock_items.add(armory_item["ID"])
+    for armory_items in _armory_data.values():
+        for armory_item in armory_items or []:
+            armory_quantities[armory_item["ID"]] = armory_item.get("available") or armory_item.get("quantity") or 0
+            armory_names[armory_item["ID"]] = armory_item["name"]
 
-            if minimum is None:
-                continue
-            elif quantity >= minimum:
-                continue
+    low_stock_embeds: typing.List[dict] = []
+    out_of_stock_embeds: typing.List[dict] = []
 
-            item: typing.Optional[Item] = Item.select(Item.market_value).where(Item.tid == armory_item["ID"]).first()
+    for item_id, minimum in faction_config["items"].items():
+        item_id = int(item_id)
 
-            suffix = (
-                ""
-                if item is None or item.market_value <= 0
-                else f" (worth about ${commas(item.market_value * (minimum - quantity))})"
-            )
-            payload["embeds"].append(
-                {
-                    "title": "Low Armory Stock",
-                    "description": f"{faction.name} is currently low on {armory_item['name']} ({commas(quantity)} "
-                    f"remaining). {commas(minimum - quantity)}x must be bought to meet the minimum quantity{suffix}.",
-                    "color": SKYNET_ERROR,
-                    "timestamp": datetime.datetime.utcnow().isoformat(),
-                    "footer": {"text": torn_timestamp()},
-                }
-            )
+        if minimum is None:
+            continue
 
-            if len(payload["embeds"]) == 10:
-                discordpost.s(
-                    f"channels/{faction_config['channel']}/messages",
-                    payload=payload,
-                    channel=faction_config["channel"],
-                ).apply_async(ignore_result=True)
-                payload["embeds"].clear()
-
-    out_of_stock_item: int
-    for out_of_stock_item in set(map(int, faction_config["items"])) - in_stock_items:
-        minimum = faction_config["items"].get(str(out_of_stock_item))
-        item: typing.Optional[Item] = (
-            Item.select(Item.market_value, Item.name).where(Item.tid == out_of_stock_item).first()
-        )
+        quantity = armory_quantities.get(item_id)
+        item = item_catalog.get(item_id)
 
-        if minimum is None:
+        if quantity is not None and quantity >= minimum:
             continue
 
+        missing_quantity = minimum - (quantity or 0)
         suffix = (
             ""
             if item is None or item.market_value <= 0
-            else f" (worth about ${commas(item.market_value * (minimum - quantity))})"
+            else f" (worth about ${commas(item.market_value * missing_quantity)})"
         )
 
-        payload["embeds"].append(
-            {
-                "title": "Armory Out of Stock",
-                "description": f"{faction.name} is currently out of stock of {item.name}. "
-                f"{commas(minimum)}x must be bought to meet the minimum quantity{suffix}.",
-                "color": SKYNET_ERROR,
-                "timestamp": datetime.datetime.utcnow().isoformat(),
-                "footer": {"text": torn_timestamp()},
-            }
-        )
+        if quantity is None:
+            out_of_stock_embeds.append(
+                {
+                    "title": "Armory Out of Stock",
+                    "description": f"{faction_name} is currently out of stock of "
+                    f"{'Unknown' if item is None else item.name}. {commas(minimum)}x must be bought to meet the "
+                    f"minimum quantity{suffix}.",
+                    "color": SKYNET_ERROR,
+                    "timestamp": datetime.datetime.utcnow().isoformat(),
+                    "footer": {"text": torn_timestamp()},
+                }
+            )
+        else:
+            low_stock_embeds.append(
+                {
+                    "title": "Low Armory Stock",
+                    "description": f"{faction_name} is currently low on {armory_names[item_id]} ({commas(quantity)} "
+                    f"remaining). {commas(missing_quantity)}x must be bought to meet the minimum quantity{suffix}.",
+                    "color": SKYNET_ERROR,
+                    "timestamp": datetime.datetime.utcnow().isoformat(),
+                    "footer": {"text": torn_timestamp()},
+                }
+            )
+
+    for embed in low_stock_embeds + out_of_stock_embeds:
+        payload["embeds"].append(embed)
 
         if len(payload["embeds"]) == 10:
-            discordpost.s(
-                f"channels/{faction_config['channel']}/messages",
-                payload=payload,
-                channel=faction_config["channel"],
-            ).apply_async(ignore_result=True)
+            queue_discord_message(faction_config["channel"], payload)
             payload["embeds"].clear()
 
     if len(payload["embeds"]) != 0:
-        discordpost.s(
-            f"channels/{faction_config['channel']}/messages",
-            payload=payload,
-            channel=faction_config["channel"],
-        ).apply_async(ignore_result=True)
+        queue_discord_message(faction_config["channel"], payload)
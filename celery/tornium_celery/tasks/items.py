@@ -33,8 +33,9 @@ logger = get_task_logger("celery_app")
     time_limit=15,
 )
 @with_db_connection
-def update_items(items_data):
-    Item.update_items(torn_get=tornget, key=TornKey.random_key().api_key)
+def update_items(items_data=None):
+    changed_items = Item.update_items(torn_get=tornget, api_key=TornKey.random_key().api_key)
+    logger.info(f"Updated {changed_items} items")
 
     rds().set(
         "tornium:items:last-update",
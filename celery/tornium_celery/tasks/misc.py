@@ -14,8 +14,12 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from tornium_commons import rds, with_db_connection
+from tornium_commons.models import Stat
 
 import celery
+from celery.utils.log import get_task_logger
+
+logger = get_task_logger("celery_app")
 
 
 @celery.shared_task(
@@ -42,3 +46,19 @@ def send_dm(discord_id: int, payload: dict):
         rds().set(f"tornium:discord:dm:{discord_id}", channel_id, nx=True, ex=86400)
 
     return discordpost.delay(endpoint=f"channels/{channel_id}/messages", payload=payload)
+
+
+@celery.shared_task(
+    name="tasks.misc.maintain_stat_partitions",
+    routing_key="default.maintain_stat_partitions",
+    queue="default",
+    time_limit=60,
+)
+@with_db_connection
+def maintain_stat_partitions():
+    # Partitions are created ahead of time so that stats are never inserted into the default partition which would
+    # otherwise prevent the creation of the partition for the month
+    created_partitions = Stat.create_partitions()
+    detached_partitions = Stat.detach_partitions()
+
+    logger.info(f"Created stat partitions {created_partitions} and detached stat partitions {detached_partitions}")
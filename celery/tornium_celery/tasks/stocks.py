@@ -18,7 +18,7 @@ import time
 import typing
 
 from tornium_commons import rds, with_db_connection
-from tornium_commons.altjson import dumps
+from tornium_commons.altjson import dumps, loads
 from tornium_commons.formatters import timestamp
 from tornium_commons.models import StockTick, TornKey
 
@@ -29,6 +29,12 @@ from .api import tornget
 
 logger = get_task_logger("celery_app")
 
+STOCK_MOVERS_KEY = "tornium:stocks:movers"
+STOCK_MOVERS_BASELINES_KEY = "tornium:stocks:movers:baselines"
+STOCK_MOVERS_COUNT = 5
+# The stock movers are updated every minute, so stale stock movers expire after a few missed stocks ticks
+STOCK_MOVERS_TTL = 300
+
 
 def _get_stocks_tick(
     stock_id: int, stocks_timestamp: typing.Optional[datetime.datetime] = None, **kwargs
@@ -112,4 +118,112 @@ def update_stock_prices(stocks_data, stocks_timestamp: datetime.datetime = datet
     rds().set("tornium:stocks", dumps({str(k): v for k, v in stocks.items()}))
     rds().set("tornium:stocks:benefits", dumps({str(k): v for k, v in stock_benefits.items()}))
 
+    try:
+        update_stock_movers(
+            {stock["stock_id"]: stock["current_price"] for stock in stocks_data["stocks"].values()}, stocks_timestamp
+        )
+    except Exception as e:
+        # The tick has already been stored, so the movers will be updated upon the next tick
+        logger.exception(e)
+
     return stocks_data
+
+
+def _stock_movers_baselines(
+    stocks_timestamp: datetime.datetime, stock_ids: typing.Iterable[int]
+) -> typing.Dict[str, typing.Dict[int, float]]:
+    # The baselines of the movers are the prices at the start of the day (UTC), six days before the start of the day,
+    # and 29 days before the start of the day. As these only change once a day, the baselines are cached in Redis until
+    # the end of the day.
+    d1_start = stocks_timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    baselines_key = f"{STOCK_MOVERS_BASELINES_KEY}:{int(d1_start.timestamp())}"
+    redis_client = rds()
+
+    cached_baselines = redis_client.get(baselines_key)
+
+    if cached_baselines is not None:
+        return {
+            period: {int(stock_id): price for stock_id, price in prices.items()}
+            for period, prices in loads(cached_baselines).items()
+        }
+
+    # Each baseline uses the tick at the timestamp or the closest subsequent tick if the tick is missing
+    baselines = {
+        period: {
+            stock_id: tick.price
+            for stock_id, tick in StockTick.closest_ticks(
+                int((d1_start - datetime.timedelta(days=days_ago)).timestamp())
+            ).items()
+        }
+        for period, days_ago in (("d1", 0), ("d7", 6), ("m1", 29))
+    }
+
+    if all(stock_id in prices for prices in baselines.values() for stock_id in stock_ids):
+        expiration = d1_start + datetime.timedelta(days=1)
+    else:
+        # Baselines missing a tick (e.g. the first tick of the day was not yet stored) are retried on the next tick
+        expiration = stocks_timestamp + datetime.timedelta(minutes=1)
+
+    redis_client.set(
+        baselines_key,
+        dumps(
+            {
+                period: {str(stock_id): price for stock_id, price in prices.items()}
+                for period, prices in baselines.items()
+            }
+        ),
+        exat=int(expiration.timestamp()),
+    )
+
+    return baselines
+
+
+def update_stock_movers(current_prices: typing.Dict[int, float], stocks_timestamp: datetime.datetime) -> dict:
+    """
+    Materialize the stock movers into Redis from the current stock prices.
+
+    The stock movers are the stocks with the largest gains and losses since the start of the day, the past week, and
+    the past month. These are updated on each stocks tick so that the movers endpoint only needs to read the
+    materialized movers from Redis.
+
+    Parameters
+    ----------
+    current_prices : dict
+        Mapping of stock ID to the current price of the stock
+    stocks_timestamp : datetime.datetime
+        Timestamp of the stocks tick
+
+    Returns
+    -------
+    movers_data : dict
+        Gainers and losers for each period
+    """
+
+    baselines = _stock_movers_baselines(stocks_timestamp, current_prices.keys())
+
+    # movers must use lists to preserve order
+    movers_data: typing.Dict[str, typing.Dict[str, list]] = {"gainers": {}, "losers": {}}
+
+    for period, baseline_prices in baselines.items():
+        # dec_change = (new - old) / old
+        changes = {
+            stock_id: round((price - baseline_prices[stock_id]) / baseline_prices[stock_id], 4)
+            for stock_id, price in current_prices.items()
+            if baseline_prices.get(stock_id)
+        }
+
+        # Changes from low to high
+        changes_sorted = sorted(changes, key=changes.get)
+
+        movers_data["losers"][period] = [
+            {"stock_id": stock_id, "change": changes[stock_id], "price": baseline_prices[stock_id]}
+            for stock_id in changes_sorted[:STOCK_MOVERS_COUNT]
+        ]
+        movers_data["gainers"][period] = [
+            {"stock_id": stock_id, "change": changes[stock_id], "price": baseline_prices[stock_id]}
+            for stock_id in changes_sorted[: -STOCK_MOVERS_COUNT - 1 : -1]
+        ]
+
+    rds().set(STOCK_MOVERS_KEY, dumps(movers_data), ex=STOCK_MOVERS_TTL)
+
+    return movers_data
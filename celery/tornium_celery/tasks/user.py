@@ -21,12 +21,14 @@ import uuid
 from decimal import DivisionByZero
 
 from peewee import DoesNotExist
-from tornium_commons import rds, with_db_connection
+from redis.commands.core import Script
+from tornium_commons import db, rds, with_db_connection
 from tornium_commons.errors import MissingKeyError, NetworkingError, TornError
 from tornium_commons.formatters import timestamp
 from tornium_commons.models import (
     Faction,
     FactionPosition,
+    LatestStat,
     ObanJob,
     PersonalStats,
     Stat,
@@ -34,6 +36,11 @@ from tornium_commons.models import (
     User,
     UserSettings,
 )
+from tornium_commons.ratelimit import (
+    TORN_INTERACTIVE_RESERVE,
+    TORN_RATELIMIT,
+    torn_key_utilization,
+)
 
 import celery
 from celery.utils.log import get_task_logger
@@ -44,6 +51,109 @@ logger = get_task_logger("celery_app")
 
 MIN_USER_UPDATE = 600
 
+# Users whose data should be refreshed are coalesced in a sorted set (scored by the time the refresh was first
+# requested) along with the API key to perform the refresh with before being drained by `refresh_pending_users`
+PENDING_USER_REFRESH_KEY = "tornium:user-refresh:pending"
+PENDING_USER_REFRESH_API_KEYS_KEY = "tornium:user-refresh:api-keys"
+PENDING_USER_REFRESH_BATCH_SIZE = 100
+
+# KEYS[1] = pending users sorted set
+# KEYS[2] = pending users' API keys hash
+# ARGV[1] = maximum number of users to pop
+#
+# The users are popped with their API keys within a single script so that a user queued again between the pop and the
+# deletion of the API key does not lose their API key. Users without an API key are returned with an empty API key.
+_POP_PENDING_USERS_SCRIPT = """
+local pending = redis.call("ZPOPMIN", KEYS[1], ARGV[1])
+local popped = {}
+
+for i = 1, #pending, 2 do
+    local api_key = redis.call("HGET", KEYS[2], pending[i])
+    redis.call("HDEL", KEYS[2], pending[i])
+
+    table.insert(popped, pending[i])
+    table.insert(popped, pending[i + 1])
+    table.insert(popped, api_key or "")
+end
+
+return popped
+"""
+
+_pop_pending_users_script: typing.Optional[Script] = None
+
+
+def queue_user_refresh(user_keys: typing.Dict[int, str]) -> None:
+    """
+    Queue users to be refreshed by `refresh_pending_users` instead of enqueuing an `update_user` task per user.
+
+    Users that are already pending keep their original position in the queue, so repeated requests to refresh the same
+    user are coalesced into a single refresh.
+
+    Parameters
+    ----------
+    user_keys : dict
+        Mapping of user ID to the API key to refresh the user with
+    """
+
+    if len(user_keys) == 0:
+        return
+
+    now = int(time.time())
+
+    pipeline = rds().pipeline()
+    pipeline.zadd(PENDING_USER_REFRESH_KEY, {str(user_id): now for user_id in user_keys}, nx=True)
+    pipeline.hset(PENDING_USER_REFRESH_API_KEYS_KEY, mapping={str(user_id): key for user_id, key in user_keys.items()})
+    pipeline.execute()
+
+
+def upsert_attack_stats(
+    opponents: typing.Dict[int, dict],
+    factions: typing.Dict[int, dict],
+    stats: typing.Dict[typing.Tuple[int, datetime.datetime, int], dict],
+) -> None:
+    """
+    Bulk upsert the opponents, the opponents' factions, and the stat entries collected from an attacks payload.
+
+    Rows are inserted in order of their primary keys so that concurrent upserts from other factions' payloads can not
+    deadlock against each other. Stat entries that already exist for the same user, time, and group are ignored by
+    the unique constraint on `(tid_id, time_added, added_group)`; the inserted stat entries update the latest stat of
+    their user and group.
+
+    Parameters
+    ----------
+    opponents : dict
+        Mapping of user ID to the user's row data
+    factions : dict
+        Mapping of faction ID to the faction's row data
+    stats : dict
+        Mapping of `(tid, time_added, added_group)` to the stat's row data
+    """
+
+    if len(factions) != 0:
+        Faction.insert_many([factions[faction_id] for faction_id in sorted(factions)]).on_conflict(
+            conflict_target=[Faction.tid],
+            preserve=[Faction.name],
+        ).execute()
+
+    if len(opponents) != 0:
+        User.insert_many([opponents[user_id] for user_id in sorted(opponents)]).on_conflict(
+            conflict_target=[User.tid],
+            preserve=[User.name, User.faction],
+        ).execute()
+
+    if len(stats) != 0:
+        # The stat entries and the latest stats are updated within the same transaction so that `latest_stat` can not
+        # miss stat entries if the upsert of the latest stats fails
+        with db.atomic():
+            inserted_stats = (
+                Stat.insert_many([stats[stat_key] for stat_key in sorted(stats)])
+                .on_conflict_ignore()
+                .returning(Stat.id, Stat.tid, Stat.added_group, Stat.battlescore, Stat.time_added)
+                .tuples()
+                .execute()
+            )
+            LatestStat.upsert(inserted_stats)
+
 
 @celery.shared_task(
     name="tasks.user.update_user",
@@ -505,8 +615,6 @@ def stat_db_attacks_user(user_data):
     else:
         return
 
-    stats_data = []
-
     User.update(
         last_attacks=datetime.datetime.fromtimestamp(
             list(user_data["attacks"].values())[-1]["timestamp_ended"],
@@ -514,6 +622,10 @@ def stat_db_attacks_user(user_data):
         ),
     ).where(User.tid == user.tid).execute()
 
+    opponents: typing.Dict[int, dict] = {}
+    factions: typing.Dict[int, dict] = {}
+    stats: typing.Dict[typing.Tuple[int, datetime.datetime, int], dict] = {}
+
     attack: dict
     for attack in user_data["attacks"].values():
         if attack["result"] in [
@@ -549,85 +661,119 @@ def stat_db_attacks_user(user_data):
         # User: faction member
         # Opponent: non-faction member regardless of attack or defend
         if attack["attacker_id"] == user.tid:  # User is the attacker
-            if attack["defender_faction"] != 0:
-                Faction.insert(
-                    tid=attack["defender_faction"],
-                    name=attack["defender_factionname"],
-                ).on_conflict(
-                    conflict_target=[Faction.tid],
-                    preserve=[Faction.name],
-                ).execute()
-
-            User.insert(
-                tid=attack["defender_id"],
-                name=attack["defender_name"],
-                faction=(attack["defender_faction"] if attack["defender_faction"] != 0 else None),
-            ).on_conflict(
-                conflict_target=[User.tid],
-                preserve=[
-                    User.name,
-                    User.faction,
-                ],
-            ).execute()
-            opponent_id = attack["defender_id"]
+            opponent_side = "defender"
+        elif attack["attacker_id"] in ("", 0):  # Attacker stealthed
+            continue
         else:  # User is the defender
-            if attack["attacker_id"] in ("", 0):  # Attacker stealthed
-                continue
-
-            if attack["attacker_faction"] != 0:
-                Faction.insert(tid=attack["attacker_faction"], name=attack["attacker_factionname"]).on_conflict(
-                    conflict_target=[Faction.tid], preserve=[Faction.name]
-                ).execute()
-
-            User.insert(
-                tid=attack["attacker_id"],
-                name=attack["attacker_name"],
-                faction=(attack["attacker_faction"] if attack["attacker_faction"] != 0 else None),
-            ).on_conflict(
-                conflict_target=[User.tid],
-                preserve=[
-                    User.name,
-                    User.faction,
-                ],
-            ).execute()
-            opponent_id = attack["attacker_id"]
+            opponent_side = "attacker"
 
-        try:
-            update_user.signature(tid=opponent_id, key=user.key).apply_async(ignore_result=True)
-        except Exception as e:
-            logger.exception(e)
-            continue
+        opponent_id = attack[f"{opponent_side}_id"]
+        opponent_faction_id = attack[f"{opponent_side}_faction"]
+
+        if opponent_faction_id != 0:
+            factions[opponent_faction_id] = {
+                "tid": opponent_faction_id,
+                "name": attack[f"{opponent_side}_factionname"],
+            }
+
+        opponents[opponent_id] = {
+            "tid": opponent_id,
+            "name": attack[f"{opponent_side}_name"],
+            "faction": opponent_faction_id if opponent_faction_id != 0 else None,
+        }
 
         try:
             if attack["defender_id"] == user.tid:
                 opponent_score = user_score / ((attack["modifiers"]["fair_fight"] - 1) * 0.375)
             else:
                 opponent_score = (attack["modifiers"]["fair_fight"] - 1) * 0.375 * user_score
-        except DivisionByZero:
+        except (DivisionByZero, ZeroDivisionError):
             continue
 
         if opponent_score == 0:
             continue
 
-        stats_data.append(
-            {
-                "tid": opponent_id,
-                "battlescore": int(opponent_score),
-                "time_added": datetime.datetime.fromtimestamp(attack["timestamp_ended"]),
-                "added_group": 0,
-            }
+        time_added = datetime.datetime.fromtimestamp(attack["timestamp_ended"], tz=datetime.timezone.utc)
+        stats[(opponent_id, time_added, 0)] = {
+            "tid": opponent_id,
+            "battlescore": int(opponent_score),
+            "time_added": time_added,
+            "added_group": 0,
+        }
+
+    try:
+        upsert_attack_stats(opponents, factions, stats)
+    except Exception as e:
+        logger.exception(e)
+
+    if user.key is not None:
+        queue_user_refresh({opponent_id: user.key for opponent_id in opponents})
+
+
+@celery.shared_task(
+    name="tasks.user.refresh_pending_users",
+    routing_key="quick.refresh_pending_users",
+    queue="quick",
+    time_limit=10,
+)
+@with_db_connection
+def refresh_pending_users():
+    global _pop_pending_users_script
+
+    redis_client = rds()
+
+    if _pop_pending_users_script is None:
+        _pop_pending_users_script = redis_client.register_script(_POP_PENDING_USERS_SCRIPT)
+
+    popped = _pop_pending_users_script(
+        keys=[PENDING_USER_REFRESH_KEY, PENDING_USER_REFRESH_API_KEYS_KEY],
+        args=[PENDING_USER_REFRESH_BATCH_SIZE],
+        client=redis_client,
+    )
+
+    if len(popped) == 0:
+        return
+
+    pending: typing.List[typing.Tuple[str, float]] = [
+        (popped[i], float(popped[i + 1])) for i in range(0, len(popped), 3)
+    ]
+    api_keys: typing.List[typing.Optional[str]] = [api_key or None for api_key in popped[2::3]]
+
+    recently_refreshed: typing.Set[int] = {
+        user.tid
+        for user in User.select(User.tid).where(
+            (User.tid << [int(user_id) for user_id, _ in pending])
+            & (User.last_refresh >= datetime.datetime.utcnow() - datetime.timedelta(seconds=MIN_USER_UPDATE))
         )
+    }
 
-        try:
-            Stat.create(
-                tid=opponent_id,
-                battlescore=int(opponent_score),
-                time_added=datetime.datetime.fromtimestamp(attack["timestamp_ended"], tz=datetime.timezone.utc),
-                added_group=0,
-            )
-        except Exception as e:
-            logger.exception(e)
+    distinct_api_keys = list({api_key for api_key in api_keys if api_key is not None})
+    remaining_calls: typing.Dict[str, int] = {
+        api_key: TORN_RATELIMIT - TORN_INTERACTIVE_RESERVE - used
+        for api_key, used in torn_key_utilization(distinct_api_keys, client=redis_client).items()
+    }
+
+    deferred: typing.Dict[str, float] = {}
+    deferred_api_keys: typing.Dict[str, str] = {}
+
+    for (user_id, queued_at), api_key in zip(pending, api_keys):
+        if api_key is None or int(user_id) in recently_refreshed:
             continue
+        elif remaining_calls[api_key] <= 0:
+            # The API key's budget for this minute has been used, so the refresh is left in the queue to be
+            # performed during the next run of this task
+            deferred[user_id] = queued_at
+            deferred_api_keys[user_id] = api_key
+            continue
+
+        remaining_calls[api_key] -= 1
+        update_user.s(tid=int(user_id), key=api_key).apply_async(ignore_result=True)
+
+    if len(deferred) != 0:
+        pipeline = redis_client.pipeline()
+        pipeline.zadd(PENDING_USER_REFRESH_KEY, deferred, nx=True)
+        pipeline.hset(PENDING_USER_REFRESH_API_KEYS_KEY, mapping=deferred_api_keys)
+        pipeline.execute()
 
 
 @celery.shared_task(
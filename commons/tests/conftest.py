@@ -0,0 +1,55 @@
+# Copyright (C) 2021-2025 tiksan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+
+import pytest
+
+from tornium_commons import redisconnection
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(redisconnection, "_client", client)
+
+    yield client
+
+    client.flushall()
+
+
+@pytest.fixture
+def celery_api(fake_redis, tmp_path, monkeypatch):
+    # The Celery app loads the settings when `tornium_celery` is first imported
+    settings_file = tmp_path / "settings.json"
+    settings_file.write_text(
+        json.dumps(
+            {
+                "bot_token": "token",
+                "bot_application_id": 1,
+                "bot_application_public": "public",
+                "bot_client_secret": "secret",
+                "flask_secret": "secret",
+                "flask_domain": "localhost",
+                "flask_admin_passphrase": "passphrase",
+                "db_dsn": "postgresql://tornium@localhost/tornium",
+                "redis_dsn": "redis://localhost",
+            }
+        )
+    )
+    monkeypatch.setenv("TORNIUM_SETTINGS_FILE", str(settings_file))
+
+    return pytest.importorskip("tornium_celery.tasks.api")
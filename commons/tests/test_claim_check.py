@@ -0,0 +1,53 @@
+# Copyright (C) 2021-2025 tiksan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+
+import pytest
+
+
+def test_claim_check_round_trip(celery_api, fake_redis):
+    response = {"attacks": {"1": {"attacker_id": 1, "defender_id": 2}}}
+    reference = celery_api.claim_check_store(json.dumps(response).encode())
+
+    assert list(reference.keys()) == [celery_api.CLAIM_CHECK_REFERENCE], "Invalid claim check reference"
+    assert celery_api.claim_check_load(reference) == response, "Invalid claimed response"
+    assert celery_api.claim_check_load(reference) == response, "Claimed response can not be claimed again"
+    assert (
+        0 < fake_redis.ttl(reference[celery_api.CLAIM_CHECK_REFERENCE]) <= celery_api.CLAIM_CHECK_TTL
+    ), "Stored response does not expire"
+
+
+def test_claim_check_compressed(celery_api, fake_redis):
+    response = {"attacks": {str(attack_id): {"code": "a" * 32} for attack_id in range(1000)}}
+    content = json.dumps(response).encode()
+    reference = celery_api.claim_check_store(content)
+
+    assert len(content) > celery_api.CLAIM_CHECK_COMPRESSION_THRESHOLD
+    assert fake_redis.strlen(reference[celery_api.CLAIM_CHECK_REFERENCE]) < len(content), "Response was not compressed"
+    assert celery_api.claim_check_load(reference) == response, "Invalid claimed compressed response"
+
+
+def test_claim_check_passthrough(celery_api):
+    assert celery_api.claim_check_load({"attacks": {}}) == {"attacks": {}}, "Response without a reference was changed"
+    assert celery_api.claim_check_load(None) is None, "Empty response was changed"
+
+
+def test_claim_check_expired(celery_api, fake_redis):
+    reference = celery_api.claim_check_store(b"{}")
+    fake_redis.delete(reference[celery_api.CLAIM_CHECK_REFERENCE])
+
+    with pytest.raises(ValueError):
+        celery_api.claim_check_load(reference)
@@ -0,0 +1,97 @@
+# Copyright (C) 2021-2025 tiksan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import pathlib
+
+import pytest
+from peewee import IntegerField, Model, SqliteDatabase
+
+# SQLite sorts nulls first in ascending order unlike Postgres, so the values do not include nulls
+_VALUES = [5, 3, 3, 8, 1, 5, 5, 2, 9, 7, 3]
+
+
+class _Row(Model):
+    value = IntegerField(null=True)
+
+
+@pytest.fixture
+def datatables(fake_redis, monkeypatch):
+    # The DataTables helpers are part of the Flask application
+    pytest.importorskip("flask")
+    monkeypatch.syspath_prepend(str(pathlib.Path(__file__).parents[2] / "application"))
+
+    database = SqliteDatabase(":memory:")
+    database.bind([_Row])
+    database.create_tables([_Row])
+    _Row.insert_many([{"value": value} for value in _VALUES]).execute()
+
+    yield pytest.importorskip("utils.datatables")
+
+    database.close()
+
+
+def _pages(datatables, ordering_direction: str, length: int, sort_field=_Row.value, **kwargs) -> list:
+    return [
+        [
+            row.id
+            for row in datatables.paginate(
+                _Row.select(),
+                "row",
+                sort_field,
+                ordering_direction,
+                start,
+                length,
+                None,
+                **kwargs,
+            )
+        ]
+        for start in range(0, len(_VALUES), length)
+    ]
+
+
+def _expected_pages(ordering_direction: str, length: int) -> list:
+    # Ties are broken by the primary key
+    rows = sorted(enumerate(_VALUES, start=1), key=lambda row: (row[1], row[0]), reverse=ordering_direction == "desc")
+    return [[row_id for row_id, _ in rows[start : start + length]] for start in range(0, len(rows), length)]
+
+
+@pytest.mark.parametrize("ordering_direction", ["asc", "desc"])
+def test_paginate_seek(datatables, fake_redis, ordering_direction):
+    pages = _pages(datatables, ordering_direction, 3, seek_fields=(_Row.value,))
+
+    assert pages == _expected_pages(ordering_direction, 3), "Invalid sought pages"
+    assert len(fake_redis.keys("tornium:datatables:seek:row:*")) != 0, "Sort keys of the pages were not cached"
+
+    # The cached sort keys are used to seek the pages
+    assert _pages(datatables, ordering_direction, 3, seek_fields=(_Row.value,)) == pages, "Invalid sought pages"
+
+
+@pytest.mark.parametrize("ordering_direction", ["asc", "desc"])
+def test_paginate_primary_key(datatables, fake_redis, ordering_direction):
+    pages = _pages(datatables, ordering_direction, 4, sort_field=_Row.id)
+    row_ids = list(range(1, len(_VALUES) + 1))
+
+    if ordering_direction == "desc":
+        row_ids.reverse()
+
+    assert pages == [row_ids[start : start + 4] for start in range(0, len(row_ids), 4)], "Invalid sought pages"
+    assert len(fake_redis.keys("tornium:datatables:seek:row:*")) != 0, "Sort keys of the pages were not cached"
+
+
+def test_paginate_unindexed(datatables, fake_redis):
+    pages = _pages(datatables, "asc", 3)
+
+    assert pages == _expected_pages("asc", 3), "Invalid pages"
+    assert len(fake_redis.keys("tornium:datatables:seek:row:*")) == 0, "Pages of an unindexed sort field were sought"
@@ -0,0 +1,133 @@
+# Copyright (C) 2021-2025 tiksan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+
+import pytest
+
+
+def _embed(title: str) -> dict:
+    return {"title": title}
+
+
+def test_merge_discord_messages(celery_api):
+    messages = celery_api.merge_discord_messages(
+        [
+            {"content": "<@&1>", "embeds": [_embed("a")]},
+            {"content": "<@&1>", "embeds": [_embed("b")]},
+            {"content": "<@&2>", "embeds": [_embed("c")], "components": [{"type": 1}]},
+        ]
+    )
+
+    assert messages == [
+        {"content": "<@&1>\n<@&2>", "embeds": [_embed("a"), _embed("b"), _embed("c")], "components": [{"type": 1}]}
+    ], "Invalid merged messages"
+
+
+def test_merge_discord_messages_limits(celery_api):
+    payloads = [{"embeds": [_embed(str(embed_id))]} for embed_id in range(celery_api.DISCORD_MAX_EMBEDS + 1)]
+    messages = celery_api.merge_discord_messages(payloads)
+
+    assert [len(message["embeds"]) for message in messages] == [
+        celery_api.DISCORD_MAX_EMBEDS,
+        1,
+    ], "Merged messages exceed the maximum number of embeds"
+
+    content = "a" * (celery_api.DISCORD_MAX_CONTENT_LENGTH - 1)
+    messages = celery_api.merge_discord_messages([{"content": content}, {"content": "b"}])
+
+    assert [message["content"] for message in messages] == [
+        content,
+        "b",
+    ], "Merged messages exceed the maximum content length"
+
+
+def test_merge_discord_messages_unmergeable(celery_api):
+    payloads = [
+        {"embeds": [_embed("a")]},
+        {"embeds": [_embed("b")], "allowed_mentions": {"parse": []}},
+        {"embeds": [_embed("c")]},
+    ]
+    messages = celery_api.merge_discord_messages(payloads)
+
+    # Payloads that can not be merged are sent as-is and are not merged with the following payloads to keep the order
+    assert messages == [
+        {"embeds": [_embed("a")], "components": []},
+        payloads[1],
+        {"embeds": [_embed("c")], "components": []},
+    ], "Invalid unmergeable messages"
+
+
+class _Response:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.headers = {}
+        self.text = ""
+
+
+@pytest.fixture
+def discord_outbound(celery_api, monkeypatch):
+    sent = []
+    responses = []
+
+    def discord_do(method, endpoint, body=None, timeout=None):
+        assert timeout is not None, "Queued messages were sent without a timeout"
+
+        response = responses.pop(0)
+
+        if isinstance(response, Exception):
+            raise response
+
+        sent.append(body)
+        return response
+
+    monkeypatch.setattr(celery_api, "discord_do", discord_do)
+    monkeypatch.setattr(celery_api, "_schedule_discord_outbound", lambda *args, **kwargs: None)
+
+    return sent, responses
+
+
+def test_drain_discord_outbound(celery_api, fake_redis, discord_outbound):
+    sent, responses = discord_outbound
+    responses.append(_Response(200))
+
+    celery_api.queue_discord_message(1, {"embeds": [_embed("a")]})
+    celery_api.queue_discord_message(1, {"embeds": [_embed("b")]})
+    celery_api.drain_discord_outbound(1)
+
+    assert sent == [{"embeds": [_embed("a"), _embed("b")], "components": []}], "Queued messages were not merged"
+    assert fake_redis.llen(f"{celery_api.DISCORD_OUTBOUND_KEY}:1") == 0, "Sent messages remain queued"
+    assert fake_redis.llen(f"{celery_api.DISCORD_OUTBOUND_KEY}:1:processing") == 0, "Sent messages remain queued"
+
+
+def test_drain_discord_outbound_failure(celery_api, fake_redis, discord_outbound):
+    requests = pytest.importorskip("requests")
+    sent, responses = discord_outbound
+    responses.extend([_Response(200), requests.exceptions.ConnectionError()])
+
+    payloads = [{"embeds": [_embed(title)], "allowed_mentions": {"parse": []}} for title in ("a", "b", "c")]
+    for payload in payloads:
+        celery_api.queue_discord_message(1, payload)
+    celery_api.queue_discord_message(1, {"embeds": [_embed("d")]})
+    celery_api.drain_discord_outbound(1)
+
+    # Messages that could not be sent are returned to the front of the queue in order
+    assert sent == [payloads[0]], "Invalid sent messages"
+    assert [json.loads(payload) for payload in fake_redis.lrange(f"{celery_api.DISCORD_OUTBOUND_KEY}:1", 0, -1)] == [
+        payloads[1],
+        payloads[2],
+        {"embeds": [_embed("d")], "components": []},
+    ], "Unsent messages were lost"
+    assert fake_redis.llen(f"{celery_api.DISCORD_OUTBOUND_KEY}:1:processing") == 0, "Unsent messages remain processing"
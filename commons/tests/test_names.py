@@ -0,0 +1,78 @@
+# Copyright (C) 2021-2025 tiksan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from tornium_commons.names import NameCache
+
+_NAMES = {1: "Chedburn", 2: "tiksan", 3: None}
+
+
+def _name_cache(queries: list, **kwargs) -> NameCache:
+    def query(ids):
+        queries.append(ids)
+        return {name_id: _NAMES[name_id] for name_id in ids if name_id in _NAMES}
+
+    return NameCache("test", query, **kwargs)
+
+
+def test_resolve_many(fake_redis):
+    queries = []
+    names = _name_cache(queries)
+
+    assert names.resolve_many([1, 2, 3, 4, None, 1]) == {1: "Chedburn", 2: "tiksan"}, "Invalid resolved names"
+    assert queries == [[1, 2, 3, 4]], "IDs were not retrieved in a single query"
+    assert fake_redis.hgetall("tornium:names:test") == {"1": "Chedburn", "2": "tiksan"}, "Invalid Redis cache"
+    assert fake_redis.ttl("tornium:names:test") > 0, "Redis cache does not expire"
+
+    assert names.resolve_many([1, 2]) == {1: "Chedburn", 2: "tiksan"}, "Invalid locally cached names"
+    assert queries == [[1, 2, 3, 4]], "Locally cached names were queried"
+
+
+def test_resolve_many_shared(fake_redis):
+    queries = []
+    _name_cache(queries).resolve_many([1, 2])
+    names = _name_cache(queries)
+
+    # A new cache (e.g. in another process) resolves the names from Redis
+    assert names.resolve_many([1, 2]) == {1: "Chedburn", 2: "tiksan"}, "Invalid names cached in Redis"
+    assert queries == [[1, 2]], "Names cached in Redis were queried"
+
+
+def test_resolve_many_bounded(fake_redis):
+    queries = []
+    names = _name_cache(queries, maxsize=1)
+    names.resolve_many([1, 2])
+
+    assert list(names._cache.keys()) == [2], "Local cache exceeded its maximum size"
+
+
+def test_resolve_many_expired(fake_redis):
+    queries = []
+    names = _name_cache(queries, ttl=0)
+    names.resolve_many([1])
+    fake_redis.delete("tornium:names:test")
+
+    assert names.resolve(1) == "Chedburn", "Invalid name after expiry"
+    assert queries == [[1], [1]], "Expired names were not queried"
+
+
+def test_invalidate(fake_redis):
+    queries = []
+    names = _name_cache(queries)
+    names.resolve_many([1, 2])
+    names.invalidate([1])
+
+    assert fake_redis.hgetall("tornium:names:test") == {"2": "tiksan"}, "Invalidated name remains in Redis"
+    assert names.resolve_many([1, 2]) == {1: "Chedburn", 2: "tiksan"}, "Invalid names after invalidation"
+    assert queries == [[1, 2], [1]], "Only the invalidated name should be queried"
@@ -0,0 +1,76 @@
+# Copyright (C) 2021-2025 tiksan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import pytest
+
+from tornium_commons.errors import MissingKeyError, RatelimitError
+from tornium_commons.ratelimit import (
+    TORN_RATELIMIT,
+    TORN_RATELIMIT_KEY_PREFIX,
+    choose_torn_key,
+    consume_tokens,
+    torn_key_utilization,
+)
+
+
+def test_consume_tokens(fake_redis):
+    for used in range(1, 4):
+        result = consume_tokens("tornium:test-ratelimit", 3)
+
+        assert result.allowed, "Tokens within the limit were rejected"
+        assert result.remaining == 3 - used, "Invalid remaining tokens"
+        assert 0 < result.reset <= 60, "Invalid window reset"
+
+    result = consume_tokens("tornium:test-ratelimit", 3)
+
+    assert not result.allowed, "Tokens beyond the limit were consumed"
+    assert result.remaining == 0, "Invalid remaining tokens"
+    assert int(fake_redis.get("tornium:test-ratelimit")) == 3, "Rejected tokens were consumed"
+    assert fake_redis.ttl("tornium:test-ratelimit") > 0, "Ratelimit key does not expire"
+
+
+def test_consume_tokens_cost(fake_redis):
+    assert consume_tokens("tornium:test-ratelimit", 10, cost=8).remaining == 2, "Invalid remaining tokens"
+    assert not consume_tokens("tornium:test-ratelimit", 10, cost=3).allowed, "Tokens beyond the limit were consumed"
+    assert consume_tokens("tornium:test-ratelimit", 10, cost=2).allowed, "Tokens within the limit were rejected"
+    assert int(fake_redis.get("tornium:test-ratelimit")) == 10, "Invalid used tokens"
+
+
+def test_torn_key_utilization(fake_redis):
+    fake_redis.set(f"{TORN_RATELIMIT_KEY_PREFIX}:a", 5)
+    consume_tokens(f"{TORN_RATELIMIT_KEY_PREFIX}:b", TORN_RATELIMIT, cost=2)
+
+    assert torn_key_utilization(["a", "b", "c", "a"]) == {"a": 5, "b": 2, "c": 0}, "Invalid utilization"
+    assert torn_key_utilization([]) == {}, "Invalid utilization without keys"
+
+
+def test_choose_torn_key(fake_redis):
+    fake_redis.set(f"{TORN_RATELIMIT_KEY_PREFIX}:a", 10)
+    fake_redis.set(f"{TORN_RATELIMIT_KEY_PREFIX}:b", 3)
+
+    assert choose_torn_key(["a", "b"]) == "b", "Key with the most remaining calls was not chosen"
+    assert choose_torn_key(["a", "b", "c"]) == "c", "Unused key was not chosen"
+
+
+def test_choose_torn_key_reserve(fake_redis):
+    fake_redis.set(f"{TORN_RATELIMIT_KEY_PREFIX}:a", TORN_RATELIMIT - 5)
+
+    assert choose_torn_key(["a"], reserve=4) == "a", "Key with calls beyond the reserve was not chosen"
+
+    with pytest.raises(RatelimitError):
+        choose_torn_key(["a"], reserve=5)
+
+    with pytest.raises(MissingKeyError):
+        choose_torn_key([])
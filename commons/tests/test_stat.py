@@ -0,0 +1,89 @@
+# Copyright (C) 2021-2025 tiksan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import datetime
+
+import pytest
+
+# The models import the OAuth models which depend on authlib
+pytest.importorskip("authlib")
+
+from tornium_commons.models import Stat, User  # noqa: E402
+from tornium_commons.models import stat as stat_module  # noqa: E402
+
+
+@pytest.fixture
+def chain_list_queries(monkeypatch):
+    queries = []
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    def execute_sql(query, parameters):
+        queries.append(parameters)
+
+        # Candidates are returned as `latest_stat` joined with the user and the user's faction
+        return [
+            (
+                stat_id,
+                stat_id + 100,
+                now - datetime.timedelta(days=stat_id),
+                battlescore,
+                "Name",
+                10,
+                now,
+                None,
+                "Okay",
+                now,
+                None,
+            )
+            for stat_id, battlescore in ((1, 95), (2, 290), (3, 300))
+        ]
+
+    monkeypatch.setattr(stat_module.db, "execute_sql", execute_sql)
+    return queries
+
+
+def test_chain_list_candidates_bucketed(fake_redis, chain_list_queries):
+    # Battlescores of 1000 and 1050 are within the same bucket
+    assert [stat_entry[0] for stat_entry in Stat._chain_list_candidates(None, 0, 1000)] == [1], "Invalid candidates"
+    assert [stat_entry[0] for stat_entry in Stat._chain_list_candidates(None, 0, 1050)] == [2], "Invalid candidates"
+
+    assert len(chain_list_queries) == 1, "Candidates of the bucket were not shared"
+    faction_id, minimum_battlescore, maximum_battlescore, _, candidate_limit = chain_list_queries[0]
+    assert faction_id is None, "Invalid faction of the candidates"
+    assert minimum_battlescore <= int(0.375 * 1000 * 0.25), "Bucket does not include the invoker's range"
+    assert maximum_battlescore >= int(0.375 * 1050 * 0.75), "Bucket does not include the invoker's range"
+    assert candidate_limit == stat_module.CHAIN_LIST_MAX_CANDIDATES, "Candidates were not capped"
+
+    candidates_keys = fake_redis.keys(f"{stat_module.CHAIN_LIST_CANDIDATES_KEY}:*")
+    assert len(candidates_keys) == 1, "Invalid cached candidates"
+    assert 0 < fake_redis.ttl(candidates_keys[0]) <= stat_module.CHAIN_LIST_CACHE_TTL, "Candidates do not expire"
+
+
+def test_chain_list_candidates_separate_buckets(fake_redis, chain_list_queries):
+    Stat._chain_list_candidates(None, 0, 1000)
+    Stat._chain_list_candidates(None, 0, 1100)
+    Stat._chain_list_candidates(None, 1, 1000)
+    Stat._chain_list_candidates(1, 0, 1000)
+
+    assert len(chain_list_queries) == 4, "Candidates were shared between buckets, difficulties, or factions"
+
+
+def test_generate_chain_list(fake_redis, chain_list_queries):
+    invoker = User(tid=1, battlescore=1050)
+    chain_list = Stat.generate_chain_list("timestamp", 0, 10, invoker)
+
+    assert [stat_entry["statid"] for stat_entry in chain_list] == [2], "Invalid chain list"
+    assert chain_list[0]["ff"] == round(1 + 8 / 3 * 290 / 1050, 2), "Invalid fair fight"
+    assert chain_list[0]["user"]["username"] == "Name [102]", "Invalid username"
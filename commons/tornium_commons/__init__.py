@@ -15,6 +15,6 @@
 
 from .config import Config
 from .db_connection import db, init_db, with_db_connection
-from .redisconnection import rds
+from .redisconnection import rds, rds_pool_stats
 
-__all__ = ["Config", "db", "init_db", "rds", "with_db_connection"]
+__all__ = ["Config", "db", "init_db", "rds", "rds_pool_stats", "with_db_connection"]
@@ -24,6 +24,34 @@ from .altjson import dumps, load, loads
 
 _T = typing.TypeVar("_T")
 
+# Incremented whenever the cached settings are written so that processes can determine whether their in-process
+# snapshot of the settings is stale
+SETTINGS_VERSION_KEY = "tornium:settings:version"
+
+_snapshot: typing.Optional["Config"] = None
+_snapshot_version: typing.Optional[str] = None
+
+
+def _cache_value(value: typing.Any) -> typing.Any:
+    if isinstance(value, bool):
+        return int(value)
+    elif isinstance(value, (dict, list)):
+        return dumps(value)
+
+    return value
+
+
+def _write_cache(data: typing.Dict[str, typing.Any]) -> None:
+    from .redisconnection import rds
+
+    if len(data) == 0:
+        return
+
+    pipeline = rds().pipeline()
+    pipeline.mset({f"tornium:settings:{key}": _cache_value(value) for key, value in data.items()})
+    pipeline.incr(SETTINGS_VERSION_KEY)
+    pipeline.execute()
+
 
 class Config(BaseModel):
     bot_token: str = Field()
@@ -39,11 +67,14 @@ class Config(BaseModel):
     db_dsn: PostgresDsn = Field()
 
     redis_dsn: RedisDsn = Field()
+    redis_max_connections: typing.Optional[int] = Field(default=None)
+    redis_pool_timeout: typing.Optional[int] = Field(default=None)
 
-    admin_users: typing.Optional[typing.List[int]] = Field()
-    admin_passphrase: typing.Optional[str] = Field()
+    admin_users: typing.Optional[typing.List[int]] = Field(default=None)
+    admin_passphrase: typing.Optional[str] = Field(default=None)
 
     torn_api_uri: typing.Optional[AnyUrl] = Field(default="https://api.torn.com")
+    http_pool_maxsize: typing.Optional[int] = Field(default=None)
 
     banned_users: typing.Dict[int, str] = Field(default={})
 
@@ -62,9 +93,6 @@ class Config(BaseModel):
         elif file is None:
             file = "settings.json"
 
-        if not disable_cache:
-            from .redisconnection import rds
-
         file: pathlib.Path
         if not isinstance(file, pathlib.Path):
             file = pathlib.Path(file)
@@ -74,17 +102,8 @@ class Config(BaseModel):
 
         loaded_data: dict = load(file)
 
-        for data_key, data_value in loaded_data.items():
-            if data_key.startswith("admin_"):
-                continue
-            elif isinstance(data_value, bool):
-                data_value = int(data_value)
-
-            if not disable_cache:
-                if isinstance(data_value, (dict, list)):
-                    rds().set(f"tornium:settings:{data_key}", dumps(data_value))
-                else:
-                    rds().set(f"tornium:settings:{data_key}", data_value)
+        if not disable_cache:
+            _write_cache({key: value for key, value in loaded_data.items() if not key.startswith("admin_")})
 
         self = cls(**loaded_data)
         self._file = file
@@ -94,16 +113,38 @@ class Config(BaseModel):
 
     @classmethod
     def from_cache(cls: typing.Type[_T]) -> _T:
+        """
+        Load the settings from the Redis cache.
+
+        The loaded settings are stored as an in-process snapshot stamped with the version of the cached settings. The
+        snapshot is re-used until the version counter in Redis changes, so an up-to-date snapshot only costs a single
+        round trip to Redis. Each call returns a copy of the snapshot so that callers can not modify the snapshot.
+
+        Settings missing from the cache use their default value.
+        """
+
+        global _snapshot, _snapshot_version
         from .redisconnection import rds
 
+        client = rds()
+        version = client.get(SETTINGS_VERSION_KEY)
+
+        if _snapshot is not None and version is not None and version == _snapshot_version:
+            return _snapshot.model_copy(deep=True)
+
+        settings_keys = [settings_key for settings_key in Config.__fields__ if not settings_key.startswith("_")]
+
+        pipeline = client.pipeline()
+        pipeline.get(SETTINGS_VERSION_KEY)
+        pipeline.mget([f"tornium:settings:{settings_key}" for settings_key in settings_keys])
+        version, values = pipeline.execute()
+
         _cached_data = {}
 
-        for settings_key in Config.__fields__:
-            if settings_key.startswith("_"):
+        for settings_key, value in zip(settings_keys, values):
+            if value is None:
                 continue
 
-            value = rds().get(f"tornium:settings:{settings_key}")
-
             try:
                 _cached_data[settings_key] = loads(value)
             except Exception:
@@ -113,6 +154,9 @@ class Config(BaseModel):
         self._file = None
         self._loaded = True
 
+        _snapshot = self.model_copy(deep=True)
+        _snapshot_version = version
+
         return self
 
     def __getitem__(self, item: str, disable_cache: bool = False) -> typing.Any:
@@ -138,44 +182,29 @@ class Config(BaseModel):
         raise ValueError("Settings unable to be loaded") from None
 
     def __setitem__(self, key: str, value: typing.Any, disable_cache: bool = False):
-        if not disable_cache:
-            from .redisconnection import rds
-
         if self._file is None:
             raise ValueError("File is not set") from None
 
         setattr(self, key, value)
 
-        if isinstance(value, bool):
-            value = int(value)
-
         if not disable_cache:
-            if isinstance(value, (dict, list)):
-                rds().set(f"tornium:settings:{key}", dumps(value))
-            else:
-                rds().set(f"tornium:settings:{key}", value)
+            _write_cache({key: value})
 
         self.save()
 
     def load(self, disable_cache: bool = False):
-        if not disable_cache:
-            from .redisconnection import rds
-
         if not self._file.exists():
             raise FileNotFoundError from None
 
         loaded_data: dict = load(self._file)
 
+        if not disable_cache:
+            _write_cache(loaded_data)
+
         for data_key, data_value in loaded_data.items():
             if isinstance(data_value, bool):
                 data_value = int(data_value)
 
-            if not disable_cache:
-                if isinstance(data_value, (dict, list)):
-                    rds().set(f"tornium:settings:{data_key}", dumps(data_value))
-                else:
-                    rds().set(f"tornium:settings:{data_key}", data_value)
-
             setattr(self, data_key, data_value)
 
         self._loaded = True
@@ -18,6 +18,7 @@ from .auth_log import AuthAction, AuthLog
 from .faction import Faction
 from .faction_position import FactionPosition
 from .item import Item
+from .latest_stat import LatestStat
 from .notification import Notification
 from .notification_trigger import NotificationTrigger
 from .oauth_authorization_code import OAuthAuthorizationCode
@@ -56,6 +57,7 @@ __all__ = [
     "Faction",
     "FactionPosition",
     "Item",
+    "LatestStat",
     "Notification",
     "NotificationTrigger",
     "OAuthAuthorizationCode",
@@ -14,9 +14,12 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import enum
+import itertools
+import typing
 
 from peewee import BooleanField, DateTimeField, ForeignKeyField, IntegerField, TextField
 
+from ..names import item_names, user_names
 from .base_model import BaseModel
 from .faction import Faction
 from .item import Item
@@ -51,27 +54,80 @@ class ArmoryUsage(BaseModel):
 
     class Meta:
         table_name = "armory_usage"
+        indexes = (
+            (("faction", "timestamp"), False),
+            (("faction", "user", "timestamp"), False),
+        )
 
     def to_dict(self) -> dict:
+        return ArmoryUsage.to_dicts([self])[0]
+
+    @staticmethod
+    def to_dicts(logs: typing.Iterable["ArmoryUsage"]) -> typing.List[dict]:
+        """
+        Convert armory logs to dictionaries with the names of the users and items resolved in bulk.
+
+        Names already selected with the logs (as `user_name`, `recipient_name`, and `item_name`) are used instead of
+        being resolved.
+
+        Parameters
+        ----------
+        logs : iterable of ArmoryUsage
+            Armory logs to convert
+
+        Returns
+        -------
+        logs : list of dict
+            Converted armory logs
+        """
+
         from ..formatters import timestamp
 
-        return {
-            "id": self.id,
-            "timestamp": timestamp(self.timestamp),
-            "action": self.action,
-            "user": {
-                "id": self.user_id,
-                "name": User.user_name(self.user_id),
-            },
-            "recipient": {
-                "id": self.recipient_id,
-                "name": User.user_name(self.recipient_id),
-            },
-            "item": {
-                "id": self.item_id,
-                "name": None if self.item_id is None else Item.item_name(self.item_id),
-                "is_nerve_refill": self.is_nerve_refill,
-                "is_energy_refill": self.is_energy_refill,
-                "quantity": self.quantity,
-            },
-        }
+        logs = list(logs)
+        resolved_user_names: typing.Dict[int, str] = {}
+        resolved_item_names: typing.Dict[int, str] = {}
+
+        for log in logs:
+            if getattr(log, "user_name", None) is not None:
+                resolved_user_names[log.user_id] = log.user_name
+            if getattr(log, "recipient_name", None) is not None:
+                resolved_user_names[log.recipient_id] = log.recipient_name
+            if log.item_id is not None and getattr(log, "item_name", None) is not None:
+                resolved_item_names[log.item_id] = log.item_name
+
+        resolved_user_names.update(
+            user_names.resolve_many(
+                user_id
+                for user_id in itertools.chain.from_iterable((log.user_id, log.recipient_id) for log in logs)
+                if user_id not in resolved_user_names
+            )
+        )
+        resolved_item_names.update(
+            item_names.resolve_many(
+                log.item_id for log in logs if log.item_id is not None and log.item_id not in resolved_item_names
+            )
+        )
+
+        return [
+            {
+                "id": log.id,
+                "timestamp": timestamp(log.timestamp),
+                "action": log.action,
+                "user": {
+                    "id": log.user_id,
+                    "name": resolved_user_names.get(log.user_id, "N/A"),
+                },
+                "recipient": {
+                    "id": log.recipient_id,
+                    "name": resolved_user_names.get(log.recipient_id, "N/A"),
+                },
+                "item": {
+                    "id": log.item_id,
+                    "name": None if log.item_id is None else resolved_item_names.get(log.item_id, "Unknown"),
+                    "is_nerve_refill": log.is_nerve_refill,
+                    "is_energy_refill": log.is_energy_refill,
+                    "quantity": log.quantity,
+                },
+            }
+            for log in logs
+        ]
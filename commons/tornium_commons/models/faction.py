@@ -14,7 +14,7 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import typing
-from functools import cached_property, lru_cache
+from functools import cached_property
 
 from peewee import (
     BigIntegerField,
@@ -27,6 +27,7 @@ from peewee import (
 )
 from playhouse.postgres_ext import JSONField
 
+from ..names import faction_names
 from .base_model import BaseModel
 from .torn_key import TornKey
 
@@ -83,12 +84,9 @@ class Faction(BaseModel):
             return f"N/A {tid}"
 
     @staticmethod
-    @lru_cache
     def faction_name(tid: int) -> str:
-        try:
-            return Faction.select(Faction.name).where(Faction.tid == tid).get().name
-        except DoesNotExist:
-            return "N/A"
+        name = faction_names.resolve(tid)
+        return "N/A" if name is None else name
 
     @cached_property
     def aa_keys(self) -> typing.List[str]:
@@ -15,21 +15,36 @@
 
 import datetime
 import typing
-from functools import lru_cache
 
 from peewee import (
+    EXCLUDED,
     BigIntegerField,
     CharField,
-    DoesNotExist,
     SmallIntegerField,
     TextField,
     chunked,
 )
 
+from ..altjson import dumps, loads
 from ..db_connection import db
+from ..names import item_names
 from ..redisconnection import rds
 from .base_model import BaseModel
 
+ITEM_CATALOG_KEY = "tornium:items:catalog"
+ITEM_CATALOG_VERSION_KEY = "tornium:items:catalog:version"
+
+
+class ItemCatalogEntry(typing.NamedTuple):
+    name: str
+    item_type: str
+    market_value: int
+
+
+# In-memory copy of the item catalog in Redis along with the version of the catalog it was loaded from
+_catalog: typing.Dict[int, ItemCatalogEntry] = {}
+_catalog_version: typing.Optional[str] = None
+
 
 class Item(BaseModel):
     tid = SmallIntegerField(primary_key=True)
@@ -40,10 +55,13 @@ class Item(BaseModel):
     circulation = BigIntegerField()
 
     @staticmethod
-    def update_items(torn_get: typing.Callable, api_key: str):
+    def update_items(torn_get: typing.Callable, api_key: str) -> int:
         """
         Update list of stored Torn items in the database via a Torn API call
 
+        Only items that are new or whose data has changed are written to the database. The item name map is only
+        invalidated when an item's name has changed.
+
         Parameters
         ----------
         torn_get : Callable, celery.Task
@@ -53,7 +71,8 @@ class Item(BaseModel):
 
         Returns
         -------
-        None
+        changed_items : int
+            Number of items that were inserted or updated
 
         Raises
         ------
@@ -76,49 +95,48 @@ class Item(BaseModel):
             # Last update was a different day
             or datetime.datetime.fromtimestamp(int(last_update)).day != datetime.datetime.utcnow().day
         ):
-            return
+            return 0
 
         items_data = torn_get(
             endpoint="torn/?selections=items",
             key=api_key,
         )
 
-        bulk_data = []
-
-        # TODO: Combine DB chunked insert and data compilation
-        item_id: int
-        item: dict
-        for item_id, item in items_data["items"].items():
-            bulk_data.append(
-                {
-                    "tid": int(item_id),
-                    "name": item.get("name", "").replace('"', "''").replace("'", "''"),
-                    "description": item.get("description", "").replace('"', "''").replace("'", "''").replace("%", "%%"),
-                    "item_type": item.get("type", ""),
-                    "market_value": item.get("market_value", 0),
-                    "circulation": item.get("circulation", 0),
-                }
-            )
+        bulk_data = [
+            {
+                "tid": int(item_id),
+                "name": item.get("name", ""),
+                "description": item.get("description", ""),
+                "item_type": item.get("type", ""),
+                "market_value": item.get("market_value", 0),
+                "circulation": item.get("circulation", 0),
+            }
+            for item_id, item in items_data["items"].items()
+        ]
+
+        existing_names: typing.Dict[int, str] = dict(Item.select(Item.tid, Item.name).tuples())
+        changed_items: typing.Dict[int, str] = {}
 
         with db.atomic():
-            for batch in chunked(bulk_data, 10):
-                cmd = """INSERT INTO item (tid, name, description, item_type, market_value, circulation)
-                    VALUES
-                """
-
-                for data in batch:
-                    cmd += f"({data['tid']}, '{data['name']}', '{data['description']}', '{data['item_type']}', {data['market_value']}, {data['circulation']}),\n"
-
-                cmd = cmd[:-2] + "\n"
-                cmd += """ON CONFLICT (tid) DO UPDATE
-                    SET name = EXCLUDED.name,
-                        description = EXCLUDED.description,
-                        item_type = EXCLUDED.item_type,
-                        market_value = EXCLUDED.market_value,
-                        circulation = EXCLUDED.circulation;
-                """
-
-                db.execute_sql(cmd)
+            for batch in chunked(bulk_data, 500):
+                # Existing items are only updated when the item's data has changed to avoid rewriting unchanged rows
+                changed_items.update(
+                    Item.insert_many(batch)
+                    .on_conflict(
+                        conflict_target=[Item.tid],
+                        preserve=[Item.name, Item.description, Item.item_type, Item.market_value, Item.circulation],
+                        where=(
+                            (Item.name != EXCLUDED.name)
+                            | (Item.description != EXCLUDED.description)
+                            | (Item.item_type != EXCLUDED.item_type)
+                            | (Item.market_value != EXCLUDED.market_value)
+                            | (Item.circulation != EXCLUDED.circulation)
+                        ),
+                    )
+                    .returning(Item.tid, Item.name)
+                    .tuples()
+                    .execute()
+                )
 
         redis_client.set(
             "tornium:items:last-update",
@@ -126,13 +144,91 @@ class Item(BaseModel):
             ex=5400,
         )  # 1.5 hours
 
+        if len(changed_items) == 0:
+            return 0
+
+        if any(existing_names.get(item_id) != name for item_id, name in changed_items.items()):
+            redis_client.delete("tornium:items:name-map")
+            item_names.invalidate(
+                item_id for item_id, name in changed_items.items() if existing_names.get(item_id) != name
+            )
+
+        Item.refresh_catalog()
+
+        return len(changed_items)
+
+    @staticmethod
+    def refresh_catalog() -> typing.Dict[int, ItemCatalogEntry]:
+        """
+        Rebuild the item catalog in Redis from the database.
+
+        The catalog's version is incremented so that the in-memory copies of the catalog in each process are reloaded
+        upon their next use.
+
+        Returns
+        -------
+        catalog : dict
+            Mapping of item ID to the item's catalog entry
+        """
+
+        catalog = {
+            item.tid: ItemCatalogEntry(name=item.name, item_type=item.item_type, market_value=item.market_value)
+            for item in Item.select(Item.tid, Item.name, Item.item_type, Item.market_value)
+        }
+
+        if len(catalog) == 0:
+            return catalog
+
+        pipeline = rds().pipeline()
+        pipeline.delete(ITEM_CATALOG_KEY)
+        pipeline.hset(ITEM_CATALOG_KEY, mapping={item_id: dumps(list(entry)) for item_id, entry in catalog.items()})
+        pipeline.incr(ITEM_CATALOG_VERSION_KEY)
+        pipeline.execute()
+
+        return catalog
+
+    @staticmethod
+    def catalog() -> typing.Dict[int, ItemCatalogEntry]:
+        """
+        Get the item catalog of each item's name, type, and market value.
+
+        The catalog is cached in memory and is only reloaded from Redis once the catalog has been refreshed (e.g. by
+        `Item.update_items`), so each call only requires a single Redis call in most cases.
+
+        Returns
+        -------
+        catalog : dict
+            Mapping of item ID to the item's catalog entry
+        """
+
+        global _catalog, _catalog_version
+
+        redis_client = rds()
+        version = redis_client.get(ITEM_CATALOG_VERSION_KEY)
+
+        if version is not None and version == _catalog_version:
+            return _catalog
+
+        pipeline = redis_client.pipeline()
+        pipeline.get(ITEM_CATALOG_VERSION_KEY)
+        pipeline.hgetall(ITEM_CATALOG_KEY)
+        version, cached_catalog = pipeline.execute()
+
+        if len(cached_catalog) == 0:
+            catalog = Item.refresh_catalog()
+            version = redis_client.get(ITEM_CATALOG_VERSION_KEY)
+        else:
+            catalog = {int(item_id): ItemCatalogEntry(*loads(entry)) for item_id, entry in cached_catalog.items()}
+
+        _catalog = catalog
+        _catalog_version = version
+
+        return catalog
+
     @staticmethod
-    @lru_cache
     def item_name(tid: int) -> str:
-        try:
-            return Item.select(Item.name).where(Item.tid == tid).get().name
-        except DoesNotExist:
-            return "Unknown"
+        name = item_names.resolve(tid)
+        return "Unknown" if name is None else name
 
     @staticmethod
     def item_str(tid: int) -> str:
@@ -0,0 +1,83 @@
+# Copyright (C) 2021-2025 tiksan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import typing
+
+from peewee import EXCLUDED, CompositeKey, DateTimeField, ForeignKeyField, IntegerField
+
+from .base_model import BaseModel
+from .user import User
+
+
+class LatestStat(BaseModel):
+    """
+    Latest stat entry of each user for each group.
+
+    This mirrors the latest row of `stat` for each `(tid, added_group)` so that chain lists can be generated from an
+    index range scan instead of de-duplicating the entire `stat` table. Rows are kept current by `LatestStat.upsert`
+    whenever stats are inserted.
+    """
+
+    class Meta:
+        table_name = "latest_stat"
+        primary_key = CompositeKey("tid", "added_group")
+        indexes = ((("added_group", "battlescore", "time_added"), False),)
+
+    tid = ForeignKeyField(User)
+    added_group = IntegerField(default=0)
+    stat_id = IntegerField()
+    battlescore = IntegerField()
+    time_added = DateTimeField()
+
+    @staticmethod
+    def upsert(stats: typing.Iterable[typing.Tuple[int, int, int, int, typing.Any]]) -> None:
+        """
+        Update the latest stats with newly inserted stat entries.
+
+        Existing latest stats are only replaced by stat entries added after them, so older stat entries inserted
+        later will not overwrite newer stat entries.
+
+        Parameters
+        ----------
+        stats : iterable of tuple
+            Inserted stat entries as `(stat_id, tid, added_group, battlescore, time_added)`
+        """
+
+        latest: typing.Dict[typing.Tuple[int, int], dict] = {}
+
+        for stat_id, tid, added_group, battlescore, time_added in stats:
+            # Postgres can not update the same row twice within an upsert, so only the latest stat entry of each user
+            # and group is upserted
+            existing = latest.get((tid, added_group))
+
+            if existing is not None and existing["time_added"] >= time_added:
+                continue
+
+            latest[(tid, added_group)] = {
+                "tid": tid,
+                "added_group": added_group,
+                "stat_id": stat_id,
+                "battlescore": battlescore,
+                "time_added": time_added,
+            }
+
+        if len(latest) == 0:
+            return
+
+        LatestStat.insert_many([latest[stat_key] for stat_key in sorted(latest)]).on_conflict(
+            conflict_target=[LatestStat.tid, LatestStat.added_group],
+            preserve=[LatestStat.stat_id, LatestStat.battlescore, LatestStat.time_added],
+            where=(EXCLUDED.time_added > LatestStat.time_added),
+        ).execute()
@@ -20,8 +20,11 @@ from .user import User
 
 
 class Retaliation(BaseModel):
+    class Meta:
+        indexes = ((("attacker", "defender"), False),)
+
     attack_code = FixedCharField(max_length=32, primary_key=True)  # Code of the attack according to the Torn API
-    attack_ended = DateTimeField(null=False)
+    attack_ended = DateTimeField(null=False, index=True)
     defender = ForeignKeyField(User, null=False)
     attacker = ForeignKeyField(User, null=False)
 
@@ -13,14 +13,34 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import datetime
+import math
+import random
+import re
 import typing
 
 from peewee import DateTimeField, ForeignKeyField, IntegerField
 
+from ..altjson import dumps, loads
 from ..db_connection import db
+from ..redisconnection import rds
 from .base_model import BaseModel
 from .user import User
 
+CHAIN_LIST_CANDIDATES_KEY = "tornium:chain-list"
+# Stats are added by the attack ingest every few seconds, so the cached candidates are not invalidated when stats are
+# added and instead expire after the TTL
+CHAIN_LIST_CACHE_TTL = 300
+# Maximum number of the most recent candidates cached for each bucket
+CHAIN_LIST_MAX_CANDIDATES = 1000
+# Ratio between the largest and the smallest battlescore of each bucket of invokers sharing chain list candidates
+CHAIN_LIST_BUCKET_RATIO = 1.1
+
+# The stat table is partitioned by month on `time_added`
+STAT_PARTITION_MONTHS_AHEAD = 3
+STAT_RETENTION_MONTHS = 24
+_PARTITION_NAME_PATTERN = re.compile(r"^stat_y(\d{4})m(\d{2})$")
+
 _DIFFICULTY_MAP = {
     0: (1.25, 1.75),
     1: (1.75, 2),
@@ -31,7 +51,22 @@ _DIFFICULTY_MAP = {
 }
 
 
+def _add_months(month: datetime.date, months: int) -> datetime.date:
+    month_index = month.year * 12 + month.month - 1 + months
+    return datetime.date(month_index // 12, month_index % 12 + 1, 1)
+
+
 class Stat(BaseModel):
+    class Meta:
+        # The table is range partitioned by month on `time_added` (see `Stat.create_partitions`) so the primary key
+        # of the table is `(id, time_added)`
+        indexes = (
+            (("tid", "time_added", "added_group"), True),
+            # Used by the keyset pagination of the stats table
+            (("battlescore", "id"), False),
+            (("time_added", "id"), False),
+        )
+
     tid = ForeignKeyField(User)
     battlescore = IntegerField(index=True)
     time_added = DateTimeField()
@@ -58,53 +93,9 @@ class Stat(BaseModel):
         elif invoker.battlescore == 0 or invoker.battlescore is None:
             raise ValueError("User does not have a battlescore") from None
 
-        # f = fair fight
-        # v = variance
-        # d = defender's stat score
-        # a = attacker's stat score
-        #
-        # f +- v = 1 + 8/3 * d/a
-        # 0.375 * a * (f +- v - 1) = d
-        #
-        # f = 11/3 is equal ratio of d/a
-        # f = 17/5 is 9/10 ratio of d/a
-
-        # Difficulty | Min FF | Max FF |     Name    |
-        #     0      |  1.25  |  1.75  |  Very Easy  |
-        #     1      |  1.75  |   2    |    Easy     |
-        #     2      |   2    |  2.25  |   Medium    |
-        #     3      |  2.25  |  2.5   |    Hard     |
-        #     4      |  2.5   |   3    |  Very Hard  |
-        #     5      |   3    |  3.4   |  Formidable |
-        #
-        # In the equation, 3x FF is equivalent to times 2.4 which is 3.4 - 1
-
-        min_ff, max_ff = _DIFFICULTY_MAP[difficulty]
-        parameters = [
-            invoker.faction_id,
-            int(0.375 * invoker.battlescore * (min_ff - 1)),
-            int(0.375 * invoker.battlescore * (max_ff - 1)),
-            invoker.faction_id,
-            limit,
-        ]
-
-        # Paramter order
-        # 0 = added faction
-        # 1 = min battlescore
-        # 2 = max battlescore
-        # 3 = user's faction ID
-        # 4 = limit
-
-        if sort == "timestamp":
-            query = """select s.id, s.tid_id, s.time_added, s.battlescore, u.name, u.level, u.last_refresh, u.faction_id, u.status, u.last_action, f.name from (select distinct on (s.tid_id) s.id, s.tid_id, s.time_added, s.battlescore from public.stat s where (s.added_group in (0, %s)) and (s.battlescore between %s and %s) order by s.tid_id, s.time_added DESC) s join public."user" as u on u.tid = s.tid_id left join public.faction as f on f.tid = u.faction_id where u.level is not null and s.time_added > now() - interval '3 months' and (u.faction_id != %s or u.faction_id is null) order by s.time_added desc limit %s"""
-        elif sort == "random":
-            query = """select s.id, s.tid_id, s.time_added, s.battlescore, u.name, u.level, u.last_refresh, u.faction_id, u.status, u.last_action, f.name from (select distinct on (s.tid_id) s.id, s.tid_id, s.time_added, s.battlescore from public.stat s where (s.added_group in (0, %s)) and (s.battlescore between %s and %s) order by s.tid_id, s.time_added DESC) s join public."user" as u on u.tid = s.tid_id left join public.faction as f on f.tid = u.faction_id where u.level is not null and s.time_added > now() - interval '3 months' and (u.faction_id != %s or u.faction_id is null) order by random() limit %s"""
-        else:  # Sorted by respect
-            query = f"""select s.id, s.tid_id, s.time_added, s.battlescore, u.name, u.level, u.last_refresh, u.faction_id, u.status, u.last_action, f.name from (select distinct on (s.tid_id) s.id, s.tid_id, s.time_added, s.battlescore from public.stat s where (s.added_group in (0, %s)) and (s.battlescore between %s and %s) order by s.tid_id, s.time_added DESC) s join public."user" as u on u.tid = s.tid_id left join public.faction as f on f.tid = u.faction_id where u.level is not null and s.time_added > now() - interval '3 months' and (u.faction_id != %s or u.faction_id is null) order by (((u.level / 198) + 197 / 198) * least(1 + 8 / 3 * (s.battlescore / {int(invoker.battlescore)}), 3)) desc, s.time_added desc limit %s"""
-
         stat_entries = []
 
-        for stat_entry in db.execute_sql(query, parameters):
+        for stat_entry in Stat._chain_list_candidates(invoker.faction_id, difficulty, invoker.battlescore):
             target_ff = round(1 + 8 / 3 * (stat_entry[3] / invoker.battlescore), 2)
 
             if target_ff > 3:
@@ -122,7 +113,7 @@ class Stat(BaseModel):
                     "statid": stat_entry[0],
                     "tid": stat_entry[1],
                     "battlescore": stat_entry[3],
-                    "timeadded": stat_entry[2].timestamp(),
+                    "timeadded": stat_entry[2],
                     "ff": target_ff,
                     "respect": round(base_respect * target_ff, 2),
                     "user": {
@@ -130,15 +121,198 @@ class Stat(BaseModel):
                         "name": stat_entry[4],
                         "username": f"{stat_entry[4]} [{stat_entry[1]}]",
                         "level": stat_entry[5],
-                        "last_refresh": (stat_entry[6].timestamp() if stat_entry[6] is not None else None),
+                        "last_refresh": stat_entry[6],
                         "faction": {
                             "tid": stat_entry[7],
                             "name": stat_entry[10],
                         },
                         "status": stat_entry[8],
-                        "last_action": stat_entry[9].timestamp(),
+                        "last_action": stat_entry[9],
                     },
                 }
             )
 
-        return stat_entries
+        if sort == "timestamp":
+            stat_entries.sort(key=lambda stat_entry: stat_entry["timeadded"], reverse=True)
+        elif sort == "random":
+            return random.sample(stat_entries, min(limit, len(stat_entries)))
+        else:  # Sorted by respect
+            stat_entries.sort(key=lambda stat_entry: (stat_entry["respect"], stat_entry["timeadded"]), reverse=True)
+
+        return stat_entries[:limit]
+
+    @staticmethod
+    def _chain_list_candidates(
+        faction_id: typing.Optional[int], difficulty: typing.Literal[0, 1, 2, 3, 4, 5], battlescore: int
+    ) -> typing.List[list]:
+        # f = fair fight
+        # v = variance
+        # d = defender's stat score
+        # a = attacker's stat score
+        #
+        # f +- v = 1 + 8/3 * d/a
+        # 0.375 * a * (f +- v - 1) = d
+        #
+        # f = 11/3 is equal ratio of d/a
+        # f = 17/5 is 9/10 ratio of d/a
+
+        # Difficulty | Min FF | Max FF |     Name    |
+        #     0      |  1.25  |  1.75  |  Very Easy  |
+        #     1      |  1.75  |   2    |    Easy     |
+        #     2      |   2    |  2.25  |   Medium    |
+        #     3      |  2.25  |  2.5   |    Hard     |
+        #     4      |  2.5   |   3    |  Very Hard  |
+        #     5      |   3    |  3.4   |  Formidable |
+        #
+        # In the equation, 3x FF is equivalent to times 2.4 which is 3.4 - 1
+        #
+        # The candidates are shared between all users of a faction whose battlescores are within the same bucket, so
+        # the candidates are retrieved for the battlescore range of the entire bucket and are then filtered by the
+        # invoker's battlescore range. Only the `CHAIN_LIST_MAX_CANDIDATES` most recent candidates of the bucket are
+        # cached.
+
+        min_ff, max_ff = _DIFFICULTY_MAP[difficulty]
+        bucket = math.floor(math.log(battlescore, CHAIN_LIST_BUCKET_RATIO))
+        minimum_battlescore = int(0.375 * battlescore * (min_ff - 1))
+        maximum_battlescore = int(0.375 * battlescore * (max_ff - 1))
+
+        redis_client = rds()
+        candidates_key = f"{CHAIN_LIST_CANDIDATES_KEY}:{faction_id}:{difficulty}:{bucket}"
+        cached_candidates = redis_client.get(candidates_key)
+
+        if cached_candidates is not None:
+            candidates = loads(cached_candidates)
+        else:
+            # Paramter order
+            # 0 = added faction
+            # 1 = min battlescore
+            # 2 = max battlescore
+            # 3 = user's faction ID
+            # 4 = maximum number of candidates
+            #
+            # The latest stats of each user are retrieved from `latest_stat` which is indexed on the group and
+            # battlescore so only the stats within the battlescore range need to be scanned. Older stats of a user
+            # whose latest stat of a group is outside of the battlescore range are not considered.
+            parameters = [
+                faction_id,
+                int(0.375 * CHAIN_LIST_BUCKET_RATIO**bucket * (min_ff - 1)),
+                int(0.375 * CHAIN_LIST_BUCKET_RATIO ** (bucket + 1) * (max_ff - 1)) + 1,
+                faction_id,
+                CHAIN_LIST_MAX_CANDIDATES,
+            ]
+            query = """select s.id, s.tid_id, s.time_added, s.battlescore, u.name, u.level, u.last_refresh, u.faction_id, u.status, u.last_action, f.name from (select distinct on (s.tid_id) s.stat_id as id, s.tid_id, s.time_added, s.battlescore from public.latest_stat s where (s.added_group in (0, %s)) and (s.battlescore between %s and %s) and s.time_added > now() - interval '3 months' order by s.tid_id, s.time_added DESC) s join public."user" as u on u.tid = s.tid_id left join public.faction as f on f.tid = u.faction_id where u.level is not null and (u.faction_id != %s or u.faction_id is null) order by s.time_added desc limit %s"""
+
+            candidates = [
+                [
+                    stat_entry[0],
+                    stat_entry[1],
+                    stat_entry[2].timestamp(),
+                    stat_entry[3],
+                    stat_entry[4],
+                    stat_entry[5],
+                    None if stat_entry[6] is None else stat_entry[6].timestamp(),
+                    stat_entry[7],
+                    stat_entry[8],
+                    None if stat_entry[9] is None else stat_entry[9].timestamp(),
+                    stat_entry[10],
+                ]
+                for stat_entry in db.execute_sql(query, parameters)
+            ]
+            redis_client.set(candidates_key, dumps(candidates), ex=CHAIN_LIST_CACHE_TTL)
+
+        return [stat_entry for stat_entry in candidates if minimum_battlescore <= stat_entry[3] <= maximum_battlescore]
+
+    @staticmethod
+    def partitions() -> typing.Dict[datetime.date, str]:
+        """
+        Get the monthly partitions attached to the stat table.
+
+        Returns
+        -------
+        partitions : dict
+            Mapping of the first day of the partition's month to the name of the partition
+        """
+
+        partitions: typing.Dict[datetime.date, str] = {}
+
+        for (partition_name,) in db.execute_sql(
+            "select c.relname from pg_inherits i join pg_class c on c.oid = i.inhrelid "
+            "join pg_class p on p.oid = i.inhparent where p.relname = 'stat'"
+        ):
+            match = _PARTITION_NAME_PATTERN.match(partition_name)
+
+            if match is None:
+                # e.g. the default partition
+                continue
+
+            partitions[datetime.date(int(match.group(1)), int(match.group(2)), 1)] = partition_name
+
+        return partitions
+
+    @staticmethod
+    def create_partitions(months_ahead: int = STAT_PARTITION_MONTHS_AHEAD) -> typing.List[str]:
+        """
+        Create the monthly partitions of the stat table from the current month through `months_ahead` months ahead.
+
+        Parameters
+        ----------
+        months_ahead : int
+            Number of months after the current month to create partitions for
+
+        Returns
+        -------
+        created_partitions : list of str
+            Names of the created partitions
+        """
+
+        current_month = datetime.datetime.now(datetime.timezone.utc).date().replace(day=1)
+        existing_partitions = Stat.partitions()
+        created_partitions = []
+
+        for months in range(months_ahead + 1):
+            month = _add_months(current_month, months)
+
+            if month in existing_partitions:
+                continue
+
+            partition_name = f"stat_y{month.year:04d}m{month.month:02d}"
+            db.execute_sql(
+                f"create table if not exists {partition_name} partition of stat "
+                f"for values from ('{month.isoformat()}') to ('{_add_months(month, 1).isoformat()}')"
+            )
+            created_partitions.append(partition_name)
+
+        return created_partitions
+
+    @staticmethod
+    def detach_partitions(retention_months: int = STAT_RETENTION_MONTHS) -> typing.List[str]:
+        """
+        Detach the monthly partitions of the stat table older than the retention period.
+
+        Detached partitions are kept as standalone tables to be archived but are no longer scanned by queries against
+        the stat table.
+
+        Parameters
+        ----------
+        retention_months : int
+            Number of months before the current month whose partitions are kept attached
+
+        Returns
+        -------
+        detached_partitions : list of str
+            Names of the detached partitions
+        """
+
+        cutoff_month = _add_months(
+            datetime.datetime.now(datetime.timezone.utc).date().replace(day=1), -retention_months
+        )
+        detached_partitions = []
+
+        for month, partition_name in sorted(Stat.partitions().items()):
+            if month >= cutoff_month:
+                break
+
+            db.execute_sql(f"alter table stat detach partition {partition_name}")
+            detached_partitions.append(partition_name)
+
+        return detached_partitions
@@ -13,6 +13,10 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import functools
+import operator
+import typing
+
 from peewee import (
     BigIntegerField,
     DateTimeField,
@@ -32,3 +36,70 @@ class StockTick(BaseModel):
     cap = BigIntegerField()
     shares = BigIntegerField()
     investors = IntegerField()
+
+    # The tick ID encodes the timestamp of the tick in the upper bits and the stock ID in the lower eight bits, so all
+    # ticks of a timestamp are within a contiguous range of the primary key's index
+
+    @staticmethod
+    def tick_id_for(stock_id: int, timestamp: int) -> int:
+        return (timestamp << 8) + stock_id
+
+    @staticmethod
+    def ticks_at(timestamps: typing.Iterable[int]) -> typing.Dict[int, typing.Dict[int, "StockTick"]]:
+        """
+        Get the ticks of all stocks at each of the timestamps with a single indexed range query.
+
+        Parameters
+        ----------
+        timestamps : iterable of int
+            Unix timestamps of the ticks
+
+        Returns
+        -------
+        ticks : dict
+            Mapping of each timestamp to a mapping of stock ID to the stock's tick
+        """
+
+        timestamps = list(timestamps)
+        ticks: typing.Dict[int, typing.Dict[int, StockTick]] = {timestamp: {} for timestamp in timestamps}
+
+        if len(timestamps) == 0:
+            return ticks
+
+        tick: StockTick
+        for tick in StockTick.select().where(
+            functools.reduce(
+                operator.or_,
+                (StockTick.tick_id.between(timestamp << 8, (timestamp << 8) + 255) for timestamp in timestamps),
+            )
+        ):
+            ticks[tick.tick_id >> 8][tick.stock_id] = tick
+
+        return ticks
+
+    @staticmethod
+    def closest_ticks(timestamp: int, window: int = 30) -> typing.Dict[int, "StockTick"]:
+        """
+        Get the earliest tick of each stock at or after the timestamp within the window with a single indexed range
+        query.
+
+        Parameters
+        ----------
+        timestamp : int
+            Unix timestamp to start searching from
+        window : int
+            Number of minutes after the timestamp to search
+
+        Returns
+        -------
+        ticks : dict
+            Mapping of stock ID to the stock's closest tick
+        """
+
+        return {
+            tick.stock_id: tick
+            for tick in StockTick.select()
+            .distinct(StockTick.stock_id)
+            .where((StockTick.tick_id >= timestamp << 8) & (StockTick.tick_id < (timestamp + window * 60) << 8))
+            .order_by(StockTick.stock_id, StockTick.tick_id)
+        }
@@ -16,7 +16,7 @@
 import datetime
 import inspect
 import typing
-from functools import cached_property, lru_cache
+from functools import cached_property
 
 from peewee import (
     BigIntegerField,
@@ -34,6 +34,7 @@ from peewee import (
 )
 from playhouse.postgres_ext import ArrayField
 
+from ..names import user_discord_ids, user_names
 from .base_model import BaseModel
 from .faction import Faction
 from .faction_position import FactionPosition
@@ -91,17 +92,18 @@ class User(BaseModel):
             return f"N/A {tid}"
 
     @staticmethod
-    @lru_cache
     def user_name(tid: int) -> str:
-        try:
-            return User.select(User.name).where(User.tid == tid).get().name
-        except DoesNotExist:
-            return "N/A"
+        name = user_names.resolve(tid)
+        return "N/A" if name is None else name
 
     @staticmethod
-    @lru_cache
     def user_discord_id(tid: int) -> int:
-        return User.select(User.discord_id).where(User.tid == tid).get().discord_id
+        discord_id = user_discord_ids.resolve(tid)
+
+        if discord_id is None:
+            return User.select(User.discord_id).where(User.tid == tid).get().discord_id
+
+        return discord_id
 
     def can_manage_crimes(self) -> bool:
         if self.faction_id is None:
@@ -14,7 +14,6 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import datetime
-import random
 import typing
 import uuid
 
@@ -34,6 +33,7 @@ from tornium_commons.formatters import commas, discord_escaper
 from tornium_commons.models import User
 
 from ..errors import MissingKeyError
+from ..ratelimit import choose_torn_key
 from ..skyutils import SKYNET_ERROR, SKYNET_GOOD
 from .base_model import BaseModel
 from .faction import Faction
@@ -93,7 +93,7 @@ class Withdrawal(BaseModel):
         if len(aa_keys) == 0:
             raise MissingKeyError()
 
-        faction_balances = tornget(f"faction/{faction_id}?selections=donations", random.choice(aa_keys))["donations"]
+        faction_balances = tornget(f"faction/{faction_id}?selections=donations", choose_torn_key(aa_keys))["donations"]
 
         try:
             current_balance = faction_balances[str(user_id)][request_type]
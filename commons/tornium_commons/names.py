@@ -0,0 +1,218 @@
+# Copyright (C) 2021-2025 tiksan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import collections
+import threading
+import time
+import typing
+
+from .redisconnection import rds
+
+T = typing.TypeVar("T", str, int)
+
+
+class NameCache(typing.Generic[T]):
+    """
+    Two-level cache of a value (e.g. the name) of each ID of a table.
+
+    Values are cached within each process in a bounded LRU cache with a TTL and within a Redis hash shared between all
+    processes that expires after a longer TTL. Values missing from both caches are retrieved from the database in a
+    single query per call to `resolve_many`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        query: typing.Callable[[typing.List[int]], typing.Dict[int, typing.Optional[T]]],
+        value_type: typing.Type[T] = str,
+        maxsize: int = 4096,
+        ttl: int = 300,
+        redis_ttl: int = 3600,
+    ):
+        """
+        Parameters
+        ----------
+        name : str
+            Name of the cache used for the Redis hash (`tornium:names:{name}`)
+        query : Callable
+            Function retrieving the values of a list of IDs from the database
+        value_type : type
+            Type of the values to convert the values from Redis to
+        maxsize : int
+            Maximum number of values cached within each process
+        ttl : int
+            Number of seconds values are cached within each process
+        redis_ttl : int
+            Number of seconds the Redis hash is cached for
+        """
+
+        self.key = f"tornium:names:{name}"
+        self.query = query
+        self.value_type = value_type
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.redis_ttl = redis_ttl
+
+        self._cache: typing.OrderedDict[int, typing.Tuple[T, float]] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_local(self, ids: typing.Iterable[int]) -> typing.Dict[int, T]:
+        now = time.monotonic()
+        values: typing.Dict[int, T] = {}
+
+        with self._lock:
+            for value_id in ids:
+                cached = self._cache.get(value_id)
+
+                if cached is None:
+                    continue
+                elif cached[1] <= now:
+                    del self._cache[value_id]
+                    continue
+
+                self._cache.move_to_end(value_id)
+                values[value_id] = cached[0]
+
+        return values
+
+    def _set_local(self, values: typing.Dict[int, T]) -> None:
+        expires_at = time.monotonic() + self.ttl
+
+        with self._lock:
+            for value_id, value in values.items():
+                self._cache[value_id] = (value, expires_at)
+                self._cache.move_to_end(value_id)
+
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def resolve_many(self, ids: typing.Iterable[int]) -> typing.Dict[int, T]:
+        """
+        Get the values of multiple IDs with at most one Redis call and one database query.
+
+        Parameters
+        ----------
+        ids : iterable of int
+            IDs to resolve
+
+        Returns
+        -------
+        values : dict
+            Mapping of ID to value; IDs that could not be found or have no value are excluded
+        """
+
+        ids = list(dict.fromkeys(value_id for value_id in ids if value_id is not None))
+        values = self._get_local(ids)
+        missing_ids = [value_id for value_id in ids if value_id not in values]
+
+        if len(missing_ids) == 0:
+            return values
+
+        redis_client = rds()
+        redis_values: typing.Dict[int, T] = {
+            value_id: self.value_type(value)
+            for value_id, value in zip(missing_ids, redis_client.hmget(self.key, missing_ids))
+            if value is not None
+        }
+        missing_ids = [value_id for value_id in missing_ids if value_id not in redis_values]
+
+        db_values: typing.Dict[int, T] = {}
+        if len(missing_ids) != 0:
+            db_values = {value_id: value for value_id, value in self.query(missing_ids).items() if value is not None}
+
+        if len(db_values) != 0:
+            pipeline = redis_client.pipeline()
+            pipeline.hset(self.key, mapping=db_values)
+            pipeline.expire(self.key, self.redis_ttl, nx=True)
+            pipeline.execute()
+
+        self._set_local({**redis_values, **db_values})
+        values.update(redis_values)
+        values.update(db_values)
+
+        return values
+
+    def resolve(self, value_id: int) -> typing.Optional[T]:
+        """
+        Get the value of an ID.
+
+        Parameters
+        ----------
+        value_id : int
+            ID to resolve
+
+        Returns
+        -------
+        value : str, int, optional
+            Value of the ID if the ID could be found
+        """
+
+        return self.resolve_many([value_id]).get(value_id)
+
+    def invalidate(self, ids: typing.Optional[typing.Iterable[int]] = None) -> None:
+        """
+        Remove the values of IDs (or all values) from the Redis cache and from this process's cache.
+
+        Parameters
+        ----------
+        ids : iterable of int, optional
+            IDs to remove; all values are removed if no IDs are provided
+        """
+
+        if ids is None:
+            with self._lock:
+                self._cache.clear()
+
+            rds().delete(self.key)
+            return
+
+        ids = list(ids)
+
+        with self._lock:
+            for value_id in ids:
+                self._cache.pop(value_id, None)
+
+        if len(ids) != 0:
+            rds().hdel(self.key, *ids)
+
+
+def _user_names(ids: typing.List[int]) -> typing.Dict[int, typing.Optional[str]]:
+    from .models import User
+
+    return dict(User.select(User.tid, User.name).where(User.tid << ids).tuples())
+
+
+def _user_discord_ids(ids: typing.List[int]) -> typing.Dict[int, typing.Optional[int]]:
+    from .models import User
+
+    return dict(User.select(User.tid, User.discord_id).where(User.tid << ids).tuples())
+
+
+def _faction_names(ids: typing.List[int]) -> typing.Dict[int, typing.Optional[str]]:
+    from .models import Faction
+
+    return dict(Faction.select(Faction.tid, Faction.name).where(Faction.tid << ids).tuples())
+
+
+def _item_names(ids: typing.List[int]) -> typing.Dict[int, typing.Optional[str]]:
+    from .models import Item
+
+    return dict(Item.select(Item.tid, Item.name).where(Item.tid << ids).tuples())
+
+
+user_names: NameCache[str] = NameCache("user", _user_names)
+user_discord_ids: NameCache[int] = NameCache("user-discord-id", _user_discord_ids, value_type=int)
+faction_names: NameCache[str] = NameCache("faction", _faction_names)
+item_names: NameCache[str] = NameCache("item", _item_names, redis_ttl=86400)
@@ -0,0 +1,226 @@
+# Copyright (C) 2021-2025 tiksan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import dataclasses
+import random
+import time
+import typing
+
+import redis
+from redis.commands.core import Script
+
+from .errors import MissingKeyError, RatelimitError
+from .redisconnection import rds
+
+# Maximum number of calls per minute per API key
+TORN_RATELIMIT = 50
+# Prefix of the ratelimit keys of Torn API keys storing the number of calls used within the current window. The keys
+# previously stored the number of remaining calls under `tornium:torn-ratelimit`, so the prefix differs to avoid old
+# keys being read as used calls.
+TORN_RATELIMIT_KEY_PREFIX = "tornium:torn-ratelimit-used"
+
+# Number of calls per minute per API key reserved for interactive requests (e.g. slash commands and API endpoints)
+# that background tasks should not use
+TORN_INTERACTIVE_RESERVE = 10
+
+# KEYS[1] = ratelimit key
+# ARGV[1] = maximum number of tokens within the window
+# ARGV[2] = Unix timestamp the window resets at
+# ARGV[3] = number of tokens to consume
+#
+# The key stores the number of tokens used within the current window so that existing readers of the ratelimit keys
+# (e.g. `api_ratelimit_response`) can continue to read the value directly. Rejected requests do not consume tokens.
+_RATELIMIT_SCRIPT = """
+local used = tonumber(redis.call("GET", KEYS[1]) or "0")
+local limit = tonumber(ARGV[1])
+local cost = tonumber(ARGV[3])
+
+if used + cost > limit then
+    local ttl = redis.call("TTL", KEYS[1])
+
+    if ttl < 0 then
+        redis.call("EXPIREAT", KEYS[1], ARGV[2])
+        ttl = redis.call("TTL", KEYS[1])
+    end
+
+    return {0, math.max(limit - used, 0), ttl}
+end
+
+used = redis.call("INCRBY", KEYS[1], cost)
+local ttl = redis.call("TTL", KEYS[1])
+
+if ttl < 0 then
+    redis.call("EXPIREAT", KEYS[1], ARGV[2])
+    ttl = redis.call("TTL", KEYS[1])
+end
+
+return {1, math.max(limit - used, 0), ttl}
+"""
+
+_script: typing.Optional[Script] = None
+
+
+@dataclasses.dataclass(frozen=True)
+class RatelimitResult:
+    allowed: bool
+    remaining: int
+    reset: int
+
+
+def window_reset(window: int = 60) -> int:
+    """
+    Get the Unix timestamp of the end of the current fixed window.
+
+    Parameters
+    ----------
+    window : int
+        Length of the window in seconds
+
+    Returns
+    -------
+    reset : int
+        Unix timestamp of the end of the current window
+    """
+
+    return int(time.time()) // window * window + window
+
+
+def consume_tokens(
+    key: str,
+    limit: int,
+    window: int = 60,
+    cost: int = 1,
+    client: typing.Optional[redis.Redis] = None,
+) -> RatelimitResult:
+    """
+    Atomically check and consume tokens from a fixed-window ratelimit bucket.
+
+    The check and the decrement are performed within a single Lua script (called through EVALSHA) so that multiple
+    workers can not overspend the bucket between reading and updating the counter.
+
+    Parameters
+    ----------
+    key : str
+        Redis key of the bucket (e.g. `tornium:torn-ratelimit-used:{api_key}`)
+    limit : int
+        Maximum number of tokens that can be consumed within a window
+    window : int
+        Length of the window in seconds; windows are aligned to the Unix epoch
+    cost : int
+        Number of tokens to consume
+    client : redis.Redis, optional
+        Redis client to use
+
+    Returns
+    -------
+    result : RatelimitResult
+        Whether the tokens were consumed, the remaining tokens, and the seconds until the window resets
+    """
+
+    global _script
+
+    if client is None:
+        client = rds()
+
+    if _script is None:
+        _script = client.register_script(_RATELIMIT_SCRIPT)
+
+    allowed, remaining, reset = _script(keys=[key], args=[limit, window_reset(window), cost], client=client)
+    return RatelimitResult(allowed=bool(allowed), remaining=int(remaining), reset=int(reset))
+
+
+def torn_key_utilization(
+    keys: typing.Iterable[str], client: typing.Optional[redis.Redis] = None
+) -> typing.Dict[str, int]:
+    """
+    Get the number of calls used by each Torn API key within the current window.
+
+    Parameters
+    ----------
+    keys : iterable of str
+        Torn API keys
+    client : redis.Redis, optional
+        Redis client to use
+
+    Returns
+    -------
+    utilization : dict
+        Mapping of each API key to the number of calls used in the current window (out of `TORN_RATELIMIT`)
+    """
+
+    keys = list(dict.fromkeys(keys))
+
+    if len(keys) == 0:
+        return {}
+
+    if client is None:
+        client = rds()
+
+    return {
+        key: int(used or 0)
+        for key, used in zip(keys, client.mget([f"{TORN_RATELIMIT_KEY_PREFIX}:{key}" for key in keys]))
+    }
+
+
+def choose_torn_key(
+    keys: typing.Iterable[str],
+    reserve: int = 0,
+    utilization: typing.Optional[typing.Dict[str, int]] = None,
+    client: typing.Optional[redis.Redis] = None,
+) -> str:
+    """
+    Choose the Torn API key with the most remaining calls within the current window.
+
+    Keys with the same number of remaining calls are chosen between randomly to spread calls between the keys.
+
+    Parameters
+    ----------
+    keys : iterable of str
+        Torn API keys to choose from
+    reserve : int
+        Number of calls per key that must remain after the call; background tasks should use
+        `TORN_INTERACTIVE_RESERVE` to leave capacity for interactive requests
+    utilization : dict, optional
+        Pre-fetched utilization of the keys from `torn_key_utilization`
+    client : redis.Redis, optional
+        Redis client to use
+
+    Returns
+    -------
+    key : str
+        Torn API key with the most remaining calls
+
+    Raises
+    ------
+    MissingKeyError
+        If there are no API keys to choose from
+    RatelimitError
+        If no API key has calls remaining beyond the reserve
+    """
+
+    keys = list(dict.fromkeys(keys))
+
+    if len(keys) == 0:
+        raise MissingKeyError
+
+    if utilization is None:
+        utilization = torn_key_utilization(keys, client=client)
+
+    least_used = min(utilization.get(key, 0) for key in keys)
+
+    if TORN_RATELIMIT - least_used <= reserve:
+        raise RatelimitError
+
+    return random.choice([key for key in keys if utilization.get(key, 0) == least_used])
@@ -13,19 +13,83 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import os
+import typing
+
 import redis
 
 from .config import Config
 
+_client: typing.Optional[redis.Redis] = None
+
+# Defaults used when the settings file does not specify the size of the pool
+_DEFAULT_MAX_CONNECTIONS = 32
+_DEFAULT_POOL_TIMEOUT = 5
+
+
+def _reset_client() -> None:
+    # Sockets of the parent process must not be shared with the forked child (e.g. Celery prefork workers), so the
+    # child will lazily create its own client and pool upon the next call to `rds()`
+    global _client
+    _client = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_client)
+
 
 def rds() -> redis.Redis:
     """
-    Returns a redis connection from the connection pool.
+    Returns the process-wide redis client backed by a shared connection pool.
+
+    The client is created upon the first call in each process with the settings file only being read at that time.
 
     Returns
     -------
     connection : redis.Redis
     """
 
-    redis_dsn = Config.from_json(disable_cache=True).__getitem__("redis_dsn", disable_cache=True)
-    return redis.from_url(str(redis_dsn), decode_responses=True)
+    global _client
+
+    if _client is not None:
+        return _client
+
+    config = Config.from_json(disable_cache=True)
+    redis_dsn = config.__getitem__("redis_dsn", disable_cache=True)
+    max_connections = config.__getitem__("redis_max_connections", disable_cache=True)
+    pool_timeout = config.__getitem__("redis_pool_timeout", disable_cache=True)
+
+    pool = redis.BlockingConnectionPool.from_url(
+        str(redis_dsn),
+        decode_responses=True,
+        max_connections=_DEFAULT_MAX_CONNECTIONS if max_connections is None else max_connections,
+        timeout=_DEFAULT_POOL_TIMEOUT if pool_timeout is None else pool_timeout,
+    )
+    _client = redis.Redis(connection_pool=pool)
+
+    return _client
+
+
+def rds_pool_stats() -> typing.Dict[str, int]:
+    """
+    Returns the connection counters of the process-wide connection pool.
+
+    Returns
+    -------
+    stats : dict
+        Maximum, created, in-use, and idle connection counts
+    """
+
+    if _client is None:
+        return {"max": 0, "created": 0, "in_use": 0, "idle": 0}
+
+    pool: redis.BlockingConnectionPool = _client.connection_pool
+    created = len(pool._connections)
+    idle = sum(1 for connection in list(pool.pool.queue) if connection is not None)
+
+    return {
+        "max": pool.max_connections,
+        "created": created,
+        "in_use": created - idle,
+        "idle": idle,
+    }
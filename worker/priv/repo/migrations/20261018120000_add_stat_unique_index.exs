@@ -0,0 +1,22 @@
+defmodule Tornium.Repo.Migrations.AddStatUniqueIndex do
+  use Ecto.Migration
+
+  def up do
+    # Duplicate stat entries need to be removed before the unique index can be created. These were previously
+    # prevented by an existence check before each insert that did not guard against concurrent inserts.
+    execute """
+    DELETE FROM stat s
+    USING stat d
+    WHERE s.tid_id = d.tid_id
+      AND s.time_added = d.time_added
+      AND s.added_group = d.added_group
+      AND s.id > d.id
+    """
+
+    create_if_not_exists unique_index(:stat, [:tid_id, :time_added, :added_group])
+  end
+
+  def down do
+    drop_if_exists index(:stat, [:tid_id, :time_added, :added_group])
+  end
+end
@@ -0,0 +1,9 @@
+defmodule Tornium.Repo.Migrations.AddRetaliationIndexes do
+  use Ecto.Migration
+
+  def change do
+    # Retaliations are completed by the attacker and defender and are timed out by the end of the attack
+    create_if_not_exists index(:retaliation, [:attacker_id, :defender_id])
+    create_if_not_exists index(:retaliation, [:attack_ended])
+  end
+end
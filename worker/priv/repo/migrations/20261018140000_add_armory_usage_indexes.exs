@@ -0,0 +1,9 @@
+defmodule Tornium.Repo.Migrations.AddArmoryUsageIndexes do
+  use Ecto.Migration
+
+  def change do
+    # Armory logs are paginated by timestamp within a faction and are optionally filtered by member
+    create_if_not_exists index(:armory_usage, [:faction_id, :timestamp])
+    create_if_not_exists index(:armory_usage, [:faction_id, :user_id, :timestamp])
+  end
+end
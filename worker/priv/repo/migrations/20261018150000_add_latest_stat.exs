@@ -0,0 +1,32 @@
+defmodule Tornium.Repo.Migrations.AddLatestStat do
+  use Ecto.Migration
+
+  def up do
+    create_if_not_exists table("latest_stat", primary_key: false) do
+      add :tid_id, references(:user, column: :tid, type: :integer, on_delete: :delete_all),
+        null: false,
+        primary_key: true
+
+      add :added_group, :integer, null: false, primary_key: true
+      add :stat_id, :integer, null: false
+      add :battlescore, :integer, null: false
+      add :time_added, :naive_datetime, null: false
+    end
+
+    # Chain lists filter the latest stats by group and by a range of battlescores
+    create_if_not_exists index(:latest_stat, [:added_group, :battlescore, :time_added])
+
+    execute """
+    INSERT INTO latest_stat (tid_id, added_group, stat_id, battlescore, time_added)
+    SELECT DISTINCT ON (s.tid_id, s.added_group) s.tid_id, s.added_group, s.id, s.battlescore, s.time_added
+    FROM stat s
+    WHERE s.tid_id IS NOT NULL
+    ORDER BY s.tid_id, s.added_group, s.time_added DESC
+    ON CONFLICT DO NOTHING
+    """
+  end
+
+  def down do
+    drop_if_exists table("latest_stat")
+  end
+end
@@ -0,0 +1,102 @@
+defmodule Tornium.Repo.Migrations.PartitionStat do
+  use Ecto.Migration
+
+  def up do
+    # The stat table is converted to a table range partitioned by month on `time_added`. Partitioned tables require
+    # the partition key to be part of the primary key and of all unique indexes.
+    execute "ALTER TABLE stat RENAME TO stat_unpartitioned"
+    execute "ALTER INDEX stat_pkey RENAME TO stat_unpartitioned_pkey"
+
+    execute """
+    CREATE TABLE stat (
+      id integer NOT NULL,
+      tid_id integer REFERENCES "user" (tid) ON DELETE CASCADE,
+      battlescore integer NOT NULL,
+      time_added timestamp(0) NOT NULL,
+      added_group integer NOT NULL,
+      PRIMARY KEY (id, time_added)
+    ) PARTITION BY RANGE (time_added)
+    """
+
+    # Stats outside of the created partitions (e.g. before the maintenance task creates the next month's partition)
+    # are stored in the default partition
+    execute "CREATE TABLE stat_default PARTITION OF stat DEFAULT"
+
+    execute """
+    DO $$
+    DECLARE
+      stat_sequence text := pg_get_serial_sequence('stat_unpartitioned', 'id');
+      partition_month date;
+    BEGIN
+      FOR partition_month IN
+        SELECT generate_series(
+          date_trunc('month', coalesce((SELECT min(time_added) FROM stat_unpartitioned), now())),
+          date_trunc('month', now()) + interval '3 months',
+          interval '1 month'
+        )::date
+      LOOP
+        EXECUTE format(
+          'CREATE TABLE IF NOT EXISTS %I PARTITION OF stat FOR VALUES FROM (%L) TO (%L)',
+          'stat_y' || to_char(partition_month, 'YYYY') || 'm' || to_char(partition_month, 'MM'),
+          partition_month,
+          (partition_month + interval '1 month')::date
+        );
+      END LOOP;
+
+      EXECUTE format('ALTER TABLE stat ALTER COLUMN id SET DEFAULT nextval(%L)', stat_sequence);
+      EXECUTE format('ALTER SEQUENCE %s OWNED BY stat.id', stat_sequence);
+    END
+    $$
+    """
+
+    execute """
+    INSERT INTO stat (id, tid_id, battlescore, time_added, added_group)
+    SELECT id, tid_id, battlescore, time_added, added_group FROM stat_unpartitioned
+    """
+
+    execute "DROP TABLE stat_unpartitioned"
+
+    create_if_not_exists unique_index(:stat, [:tid_id, :time_added, :added_group])
+    create_if_not_exists index(:stat, [:battlescore], name: :stat_battlescore)
+    create_if_not_exists index(:stat, [:tid_id, desc: :time_added], name: :stat_tid_id)
+    create_if_not_exists index(:stat, [:added_group], name: :statnew_added_group)
+  end
+
+  def down do
+    execute "ALTER TABLE stat RENAME TO stat_partitioned"
+    execute "ALTER INDEX stat_pkey RENAME TO stat_partitioned_pkey"
+
+    execute """
+    CREATE TABLE stat (
+      id integer PRIMARY KEY,
+      tid_id integer REFERENCES "user" (tid) ON DELETE CASCADE,
+      battlescore integer NOT NULL,
+      time_added timestamp(0) NOT NULL,
+      added_group integer NOT NULL
+    )
+    """
+
+    execute """
+    INSERT INTO stat (id, tid_id, battlescore, time_added, added_group)
+    SELECT id, tid_id, battlescore, time_added, added_group FROM stat_partitioned
+    """
+
+    execute """
+    DO $$
+    DECLARE
+      stat_sequence text := pg_get_serial_sequence('stat_partitioned', 'id');
+    BEGIN
+      EXECUTE format('ALTER TABLE stat ALTER COLUMN id SET DEFAULT nextval(%L)', stat_sequence);
+      EXECUTE format('ALTER SEQUENCE %s OWNED BY stat.id', stat_sequence);
+    END
+    $$
+    """
+
+    execute "DROP TABLE stat_partitioned CASCADE"
+
+    create_if_not_exists unique_index(:stat, [:tid_id, :time_added, :added_group])
+    create_if_not_exists index(:stat, [:battlescore], name: :stat_battlescore)
+    create_if_not_exists index(:stat, [:tid_id, desc: :time_added], name: :stat_tid_id)
+    create_if_not_exists index(:stat, [:added_group], name: :statnew_added_group)
+  end
+end
@@ -0,0 +1,9 @@
+defmodule Tornium.Repo.Migrations.AddStatSeekIndexes do
+  use Ecto.Migration
+
+  def change do
+    # The stats table is paginated by seeking from the `(sort column, id)` of the previous page's last stat
+    create_if_not_exists index(:stat, [:battlescore, :id])
+    create_if_not_exists index(:stat, [:time_added, :id])
+  end
+end